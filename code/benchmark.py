@@ -0,0 +1,231 @@
+import os
+import json
+import platform
+import random
+import subprocess
+import tracemalloc
+from argparse import ArgumentParser
+from time import perf_counter, strftime
+
+# benchmarks always run without a window or a sound card
+os.environ['SDL_VIDEODRIVER'] = 'dummy'
+os.environ['SDL_AUDIODRIVER'] = 'dummy'
+
+import pygame
+from settings import *
+from level import Level
+from soil import FARMABLE
+
+WALK_PATTERN = [pygame.K_RIGHT, pygame.K_DOWN, pygame.K_LEFT, pygame.K_UP]
+
+
+class ScriptedKeys:
+    def __init__(self):
+        self.pressed = set()
+
+    def __call__(self):
+        return self
+
+    def __getitem__(self, key):
+        return key in self.pressed
+
+    def press(self, *keys):
+        self.pressed = set(keys)
+
+
+def place_player(player, pos):
+    player.pos.update(pos)
+    player.hitbox.center = (round(player.pos.x), round(player.pos.y))
+    player.rect.center = player.hitbox.center
+
+
+def walk(level, keys, frame):
+    keys.press(WALK_PATTERN[frame // 60 % len(WALK_PATTERN)])
+
+
+class Scenario:
+    def __init__(self, name, setup, script, frames):
+        self.name = name
+        self.setup = setup
+        self.script = script
+        self.frames = frames
+
+
+def setup_farm(level, keys):
+    soil_layer = level.soil_layer
+    for x, y in list(soil_layer.grid.find(FARMABLE)):
+        point = (x * TILE_SIZE + TILE_SIZE / 2, y * TILE_SIZE + TILE_SIZE / 2)
+        soil_layer.get_hit(point)
+        soil_layer.water(point)
+        soil_layer.plant_seed(point, 'corn')
+
+    # stand in the middle of the farm
+    farm = list(soil_layer.grid.find(FARMABLE))
+    middle_x = sum(x for x, _ in farm) / len(farm)
+    middle_y = sum(y for _, y in farm) / len(farm)
+    place_player(level.player, (middle_x * TILE_SIZE, middle_y * TILE_SIZE))
+
+
+def setup_rain(level, keys):
+    level.raining = True
+    level.soil_layer.raining = True
+
+
+def chop_trees(level, keys, frame):
+    trees = [tree for tree in level.tree_sprites if tree.alive]
+    if not trees:
+        keys.press()
+        return
+
+    player = level.player
+    if not player.timers['tool use'].active:
+        player.selected_tool = 'axe'
+        player.status = 'right_idle'
+        place_player(player, trees[0].rect.center - PLAYER_TOOL_OFFSET['right'])
+    keys.press(pygame.K_SPACE)
+
+
+def setup_bed(level, keys):
+    setup_farm(level, keys)
+    bed = [sprite for sprite in level.interaction_sprites if sprite.name == 'Bed'][0]
+    place_player(level.player, bed.rect.center)
+
+
+def sleep_cycles(level, keys, frame):
+    # the key is ignored while the transition plays, so holding it sleeps again right after waking up
+    keys.press(pygame.K_RETURN)
+
+
+def setup_shop(level, keys):
+    level.toggle_shop()
+
+
+def browse_shop(level, keys, frame):
+    keys.press(pygame.K_DOWN if frame % 40 < 20 else pygame.K_SPACE)
+
+
+SCENARIOS = [
+    Scenario('farm', setup_farm, walk, 1200),
+    Scenario('rain', setup_rain, walk, 1200),
+    Scenario('chop', None, chop_trees, 4000),
+    # one sleep and reset cycle takes 256 frames of transition
+    Scenario('sleep', setup_bed, sleep_cycles, 256 * 100),
+    Scenario('shop', setup_shop, browse_shop, 1200)
+]
+
+
+def build_level(scenario, seed):
+    random.seed(seed)
+    level = Level()
+    keys = ScriptedKeys()
+    level.player.get_keys = keys
+    level.menu.get_keys = keys
+    if scenario.setup:
+        scenario.setup(level, keys)
+    return level, keys
+
+
+def play(level, keys, scenario, frames):
+    frame_times = []
+    for frame in range(frames):
+        start = perf_counter()
+        pygame.event.pump()
+        scenario.script(level, keys, frame)
+        level.update(FIXED_DT)
+        pygame.display.update(level.draw())
+        frame_times.append(perf_counter() - start)
+    return frame_times
+
+
+def percentile(samples, p):
+    return samples[round((len(samples) - 1) * p / 100)]
+
+
+def run_scenario(scenario, scale, seed, measure_memory):
+    frames = max(1, int(scenario.frames * scale))
+
+    level, keys = build_level(scenario, seed)
+    frame_times = sorted(play(level, keys, scenario, frames))
+    result = {
+        'frames': frames,
+        'frame_ms': {
+            'mean': sum(frame_times) / frames * 1000,
+            'p50': percentile(frame_times, 50) * 1000,
+            'p95': percentile(frame_times, 95) * 1000,
+            'p99': percentile(frame_times, 99) * 1000,
+            'max': frame_times[-1] * 1000
+        },
+        'sprites': len(level.all_sprites)
+    }
+
+    # a second, traced run so tracemalloc does not distort the frame times
+    if measure_memory:
+        level, keys = build_level(scenario, seed)
+        tracemalloc.start()
+        start_size, _ = tracemalloc.get_traced_memory()
+        before = tracemalloc.take_snapshot()
+        play(level, keys, scenario, frames)
+        after = tracemalloc.take_snapshot()
+        end_size, peak_size = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        allocated = [stat for stat in after.compare_to(before, 'filename') if stat.size_diff > 0]
+        result['memory_kb'] = {
+            'peak': peak_size / 1024,
+            'net': (end_size - start_size) / 1024,
+            'allocated': sum(stat.size_diff for stat in allocated) / 1024
+        }
+        result['allocated_blocks'] = sum(stat.count_diff for stat in allocated)
+
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    names = [scenario.name for scenario in SCENARIOS]
+    parser = ArgumentParser(description='Run scripted benchmark scenarios and write the results as JSON')
+    parser.add_argument('scenarios', nargs='*', default=names, metavar='SCENARIO', help=f'any of {", ".join(names)}')
+    parser.add_argument('--output', default='benchmark.json', help='result file')
+    parser.add_argument('--scale', type=float, default=1, help='multiply every scenario length, e.g. 0.1 for a quick run')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc run')
+    args = parser.parse_args()
+    for name in args.scenarios:
+        if name not in names:
+            parser.error(f'unknown scenario {name}')
+
+    pygame.init()
+    pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+
+    results = {
+        'commit': git_commit(),
+        'date': strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'pygame': pygame.version.ver,
+        'platform': platform.platform(),
+        'scale': args.scale,
+        'seed': args.seed,
+        'scenarios': {}
+    }
+
+    for scenario in SCENARIOS:
+        if scenario.name in args.scenarios:
+            result = run_scenario(scenario, args.scale, args.seed, not args.no_memory)
+            results['scenarios'][scenario.name] = result
+            frame_ms = result['frame_ms']
+            print(f'{scenario.name:<8}{result["frames"]:>7} frames  mean {frame_ms["mean"]:6.2f} ms  p95 {frame_ms["p95"]:6.2f} ms  p99 {frame_ms["p99"]:6.2f} ms')
+
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2)
+
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
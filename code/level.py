@@ -1,31 +1,36 @@
 from random import randint
 
 import pygame
-from pytmx.util_pygame import load_pygame
 from settings import *
 from player import Player
 from overlay import Overlay
-from sprites import Generic, Water, WildFlower, Tree, Interaction, Particle
-from support import import_folder
+from sprites import Generic, AnimationClock, Water, WildFlower, Tree, Interaction, Particle
+from support import import_folder, import_image, import_sound
 from transition import Transition
 from soil import SoilLayer
 from sky import Rain, Sky
 from menu import Menu
+from spatial import SpatialGrid, merge_rects
+from tilemap import load_map
+from profiler import Profiler
 
 DEBUG = False
+PROFILE = False
 
 class Level:
 
     def __init__(self):
         self.display_surface = pygame.display.get_surface()
+        self.profiler = Profiler(PROFILE)
 
         # sprite groups
         self.all_sprites = CameraGroup()
-        self.collision_sprites = pygame.sprite.Group()
+        self.collision_sprites = CollisionGroup()
         self.tree_sprites = pygame.sprite.Group()
         self.interaction_sprites = pygame.sprite.Group()
 
-        self.soil_layer = SoilLayer(self.all_sprites, self.collision_sprites)
+        self.tile_map = load_map('../data/map.tmx')
+        self.soil_layer = SoilLayer(self.all_sprites, self.collision_sprites, self.tile_map)
         self.setup()
         self.overlay = Overlay(self.player)
         self.transition = Transition(self.reset, self.player)
@@ -37,65 +42,87 @@ class Level:
 
         self.menu = Menu(self.player, self.toggle_shop)
         self.shop_active = False
+        self.shop_snapshot = None
+        self.shop_state = None
+        self.shop_tint = None
+        self.view = None
 
-        self.success = pygame.mixer.Sound('../audio/success.wav')
+        self.success = import_sound('../audio/success.wav')
         self.success.set_volume(0.5)
 
-        self.music = pygame.mixer.Sound('../audio/music.mp3')
+        self.music = import_sound('../audio/music.mp3')
         self.music.set_volume(0.2)
         self.music.play(loops=-1)
 
     def setup(self):
-        tmx_data = load_pygame('../data/map.tmx')
+        tile_map = self.tile_map
 
         # house
         for layer in ['HouseFloor', 'HouseFurnitureBottom']:
-            for x, y, surf in tmx_data.get_layer_by_name(layer).tiles():
-                Generic((x*TILE_SIZE, y*TILE_SIZE), surf, self.all_sprites, LAYERS['house bottom'])
+            with tile_map.timed(layer):
+                for x, y, surf in tile_map.tiles(layer):
+                    Generic((x*TILE_SIZE, y*TILE_SIZE), surf, self.all_sprites, LAYERS['house bottom'])
 
         for layer in ['HouseWalls', 'HouseFurnitureTop']:
-            for x, y, surf in tmx_data.get_layer_by_name(layer).tiles():
-                Generic((x * TILE_SIZE, y * TILE_SIZE), surf, self.all_sprites, LAYERS['main'])
+            with tile_map.timed(layer):
+                for x, y, surf in tile_map.tiles(layer):
+                    Generic((x * TILE_SIZE, y * TILE_SIZE), surf, self.all_sprites, LAYERS['main'])
 
         # Fence
-
-        for x, y, surf in tmx_data.get_layer_by_name('Fence').tiles():
-            Generic((x * TILE_SIZE, y * TILE_SIZE), surf, [self.all_sprites, self.collision_sprites], LAYERS['main'])
+        with tile_map.timed('Fence'):
+            for x, y, surf in tile_map.tiles('Fence'):
+                Generic((x * TILE_SIZE, y * TILE_SIZE), surf, [self.all_sprites, self.collision_sprites], LAYERS['main'])
 
         # Water
-        water_frames = import_folder('../graphics/water')
-        for x, y, surf in tmx_data.get_layer_by_name('Water').tiles():
-            Water((x * TILE_SIZE, y * TILE_SIZE), water_frames, self.all_sprites)
+        with tile_map.timed('Water'):
+            self.water_clock = AnimationClock(import_folder('../graphics/water'), 5)
+            for x, y, surf in tile_map.tiles('Water'):
+                Water((x * TILE_SIZE, y * TILE_SIZE), self.water_clock, self.all_sprites)
 
         # Wild flowers
-        for obj in tmx_data.get_layer_by_name('Decoration'):
-            WildFlower((obj.x, obj.y), obj.image, [self.all_sprites, self.collision_sprites])
+        with tile_map.timed('Decoration'):
+            for obj in tile_map.objects('Decoration'):
+                WildFlower((obj.x, obj.y), obj.image, [self.all_sprites, self.collision_sprites])
 
         # Trees
-        for obj in tmx_data.get_layer_by_name('Trees'):
-            Tree((obj.x, obj.y), obj.image, [self.all_sprites, self.collision_sprites, self.tree_sprites], obj.name, self.player_add)
+        with tile_map.timed('Trees'):
+            for obj in tile_map.objects('Trees'):
+                Tree((obj.x, obj.y), obj.image, [self.all_sprites, self.collision_sprites, self.tree_sprites], obj.name, self.player_add)
 
         # collision
-        for x, y, surf in tmx_data.get_layer_by_name('Collision').tiles():
-            Generic((x * TILE_SIZE, y * TILE_SIZE), pygame.Surface((TILE_SIZE, TILE_SIZE)), self.collision_sprites)
+        with tile_map.timed('Collision'):
+            for x, y, surf in tile_map.tiles('Collision'):
+                Generic((x * TILE_SIZE, y * TILE_SIZE), pygame.Surface((TILE_SIZE, TILE_SIZE)), self.collision_sprites)
 
         # Player
-        for obj in tmx_data.get_layer_by_name('Player'):
-            if obj.name == 'Start':
-                self.player = Player((obj.x, obj.y), self.all_sprites, self.collision_sprites, self.tree_sprites, self.interaction_sprites, self.soil_layer, self.toggle_shop)
-
-            if obj.name == 'Bed':
-                Interaction((obj.x, obj.y), (obj.width, obj.height), self.interaction_sprites, obj.name)
-
-            if obj.name == 'Trader':
-                Interaction((obj.x, obj.y), (obj.width, obj.height), self.interaction_sprites, obj.name)
-
-        Generic(
-            pos=(0, 0),
-            surf=pygame.image.load('../graphics/world/ground.png').convert_alpha(),
-            groups=self.all_sprites,
-            z=LAYERS['ground']
-        )
+        with tile_map.timed('Player'):
+            for obj in tile_map.objects('Player'):
+                if obj.name == 'Start':
+                    self.player = Player((obj.x, obj.y), self.all_sprites, self.collision_sprites, self.tree_sprites, self.interaction_sprites, self.soil_layer, self.toggle_shop)
+
+                if obj.name == 'Bed':
+                    Interaction((obj.x, obj.y), (obj.width, obj.height), self.interaction_sprites, obj.name)
+
+                if obj.name == 'Trader':
+                    Interaction((obj.x, obj.y), (obj.width, obj.height), self.interaction_sprites, obj.name)
+
+        with tile_map.timed('ground'):
+            Generic(
+                pos=(0, 0),
+                surf=import_image('../graphics/world/ground.png'),
+                groups=self.all_sprites,
+                z=LAYERS['ground']
+            )
+
+        if DEBUG:
+            print(tile_map.timing_report())
+
+    def is_idle(self):
+        # only slow ambient animation on screen, e.g. water and the sky tint
+        player = self.player
+        if self.shop_active or self.raining or player.sleep or player.direction:
+            return False
+        return not any(timer.active for timer in player.timers.values())
 
     def player_add(self, item):
         self.player.item_inventory[item] += 1
@@ -103,57 +130,169 @@ class Level:
 
     def toggle_shop(self):
         self.shop_active = not self.shop_active
+        self.shop_snapshot = None
+        self.view = None
 
     def reset(self):
-        self.soil_layer.update_plants()
+        self.start_day()
 
-        # soil
-        self.soil_layer.remove_water()
+    def start_day(self, materialize=True):
+        # crops and soil
         self.raining = randint(0, 10) > 7
-        self.soil_layer.raining = self.raining
-        if self.raining:
-            self.soil_layer.water_all()
+        self.soil_layer.advance_day(self.raining, materialize)
 
-        # apples on the trees
-        for tree in self.tree_sprites.sprites():
-            for apple in tree.apple_sprites.sprites():
-                apple.kill()
-            tree.create_fruit()
+        # apples on the trees, only the last of several skipped days matters
+        if materialize:
+            for tree in self.tree_sprites.sprites():
+                for apple in tree.apple_sprites.sprites():
+                    apple.kill()
+                tree.create_fruit()
 
         self.sky.start_color = [255, 255, 255]
 
+    def advance_days(self, days):
+        # fast forward: sprites are only built for the final day
+        for day in range(days):
+            self.start_day(materialize=day == days - 1)
+
     def plant_collision(self):
         if self.soil_layer.plant_sprites:
             for plant in self.soil_layer.plant_sprites.sprites():
                 if plant.harvestable and plant.rect.colliderect(self.player.hitbox):
                     self.player_add(plant.plant_type)
-                    plant.kill()
+                    self.soil_layer.remove_plant(plant)
                     Particle(plant.rect.topleft, plant.image, self.all_sprites, z=LAYERS['main'])
-                    self.soil_layer.grid[plant.rect.centery // TILE_SIZE][plant.rect.centerx // TILE_SIZE].remove('P')
-
-    def run(self, dt):
 
+    def update(self, dt):
+        profile = self.profiler.section
 
-        # drawing logic
-        self.display_surface.fill("black")
-        self.all_sprites.custom_draw(self.player)
+        # soil restored from a save gets its sprites over several ticks
+        if self.soil_layer.pending_cells:
+            with profile('load_pending'):
+                self.soil_layer.load_pending(LOAD_BATCH)
 
-        # updates
         if self.shop_active:
-            self.menu.update()
+            with profile('menu.input'):
+                self.menu.input(dt)
         else:
-            self.all_sprites.update(dt)
-            self.plant_collision()
+            with profile('all_sprites.update'):
+                self.water_clock.update(dt)
+                self.all_sprites.update(dt)
+            with profile('plant_collision'):
+                self.plant_collision()
+            with profile('rain.update'):
+                self.rain.update(dt, self.raining)
 
-        self.overlay.display()
+        with profile('sky.update'):
+            self.sky.update(dt)
+
+        if self.player.sleep:
+            with profile('transition.update'):
+                self.transition.update(dt)
 
-        if self.raining and not self.shop_active:
-            self.rain.update()
+    def draw(self):
+        # returns the areas for pygame.display.update, None for the whole screen
+        profile = self.profiler.section
 
-        self.sky.display(dt)
+        if self.shop_active:
+            with profile('menu.display'):
+                return self.draw_shop()
+
+        self.display_surface.fill("black")
+        with profile('custom_draw'):
+            self.all_sprites.custom_draw(self.player)
+
+        with profile('overlay.display'):
+            overlay_dirty = self.overlay.display()
+        with profile('sky.display'):
+            self.sky.display()
 
         if self.player.sleep:
-            self.transition.play(dt)
+            with profile('transition.display'):
+                self.transition.display()
+
+        self.profiler.display()
+
+        # only a still camera and an unchanged tint allow partial updates
+        view = (tuple(self.all_sprites.offset), self.sky.get_tint())
+        full_update = not DIRTY_RECTS or view != self.view or self.player.sleep or self.profiler.enabled
+        self.view = view
+        return None if full_update else merge_rects(self.all_sprites.dirty + overlay_dirty)
+
+    def draw_shop(self):
+        # the world is frozen behind the shop: draw it once, then rebuild the frame only on changes
+        if not self.shop_snapshot:
+            self.display_surface.fill("black")
+            self.all_sprites.custom_draw(self.player)
+            self.shop_snapshot = self.display_surface.copy()
+            self.shop_state = None
+
+        state = self.menu.state()
+        tint = self.sky.get_tint()
+        if state == self.shop_state and tint == self.shop_tint and not self.profiler.enabled:
+            return []
+
+        self.display_surface.blit(self.shop_snapshot, (0, 0))
+        dirty = self.menu.display()
+        self.overlay.display()
+        self.sky.display()
+        self.profiler.display()
+
+        # the tint covers the whole screen, so a new tint needs a full update
+        full_update = self.shop_state is None or tint != self.shop_tint or self.profiler.enabled
+        self.shop_state = state
+        self.shop_tint = tint
+        return None if full_update else dirty
+
+    def sprite_counts(self):
+        counts = {
+            'sprites all': len(self.all_sprites),
+            'sprites collision': len(self.collision_sprites),
+            'sprites tree': len(self.tree_sprites),
+            'sprites soil': len(self.soil_layer.soil_sprites),
+            'sprites water': len(self.soil_layer.water_sprites),
+            'sprites plant': len(self.soil_layer.plant_sprites),
+            'sprites rain': self.rain.count()
+        }
+        for name, layer in LAYERS.items():
+            counts[f'sprites layer {name}'] = len(self.all_sprites.layers[layer])
+        return counts
+
+
+class CollisionGroup(pygame.sprite.Group):
+    def __init__(self):
+        super().__init__()
+
+        # broadphase: spatial hash on hitboxes
+        self.grid = SpatialGrid(TILE_SIZE)
+        self.sprite_order = {}
+        self.pending = []
+        self.added = 0
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite)
+        # the hitbox is only set after the sprite joined its groups
+        self.pending.append(sprite)
+        self.sprite_order[sprite] = self.added
+        self.added += 1
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        self.grid.remove(sprite)
+        del self.sprite_order[sprite]
+
+    def refresh(self, sprite):
+        if sprite in self.spritedict and hasattr(sprite, 'hitbox'):
+            self.grid.move(sprite, sprite.hitbox)
+
+    def flush_pending(self):
+        for sprite in self.pending:
+            self.refresh(sprite)
+        self.pending.clear()
+
+    def nearby(self, rect):
+        self.flush_pending()
+        return sorted(self.grid.query(rect), key=self.sprite_order.get)
 
 
 class CameraGroup(pygame.sprite.Group):
@@ -162,22 +301,214 @@ class CameraGroup(pygame.sprite.Group):
         self.display_surface = pygame.display.get_surface()
         self.offset = pygame.math.Vector2()
 
+        # render queue: one spatial index per layer
+        self.layers = {layer: SpatialGrid() for layer in LAYERS.values()}
+        self.sprite_layers = {}
+        self.sprite_order = {}
+
+        # draw rank per static layer in y order, re-ranked only when sprites land or move in it;
+        # the main layer changes every frame, so only its sprites on screen get sorted
+        self.layer_ranks = {layer: {} for layer in LAYERS.values() if layer != LAYERS['main']}
+        self.unsorted_layers = set()
+        self.moving_sprites = set()
+        self.pending = []
+        self.added = 0
+
+        # sprites with their own update, in join order; static and clock animated ones are skipped
+        self.updating = {}
+
+        # non-sprite drawing hooks, e.g. the rain particles
+        self.renderers = {layer: [] for layer in LAYERS.values()}
+
+        # static layers pre-rendered into chunk surfaces
+        self.baked_layers = {LAYERS[name] for name in BAKED_LAYERS} if BAKE_STATIC_LAYERS else set()
+        self.chunks = {layer: {} for layer in self.baked_layers}
+        self.dirty_chunks = {layer: set() for layer in self.baked_layers}
+
+        # screen areas drawn last frame and the ones that changed since
+        self.drawn = {}
+        self.drawn_extra = []
+        self.dirty = []
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite)
+        # sprites join the group before their z and rect are set, so index them on the next draw
+        self.pending.append(sprite)
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        layer = self.sprite_layers.pop(sprite, None)
+        if layer is not None:
+            self.invalidate(layer, self.layers[layer].bounds(sprite))
+            self.layers[layer].remove(sprite)
+            self.unrank(layer, sprite)
+            del self.sprite_order[sprite]
+            self.moving_sprites.discard(sprite)
+            self.updating.pop(sprite, None)
+
+    def refresh(self, sprite):
+        layer = self.sprite_layers.get(sprite)
+        if layer is None:
+            return
+
+        self.invalidate(layer, self.layers[layer].bounds(sprite))
+        if layer != sprite.z:
+            self.layers[layer].remove(sprite)
+            self.layers[sprite.z].insert(sprite, sprite.rect)
+            self.unrank(layer, sprite)
+            self.sprite_layers[sprite] = sprite.z
+        else:
+            self.layers[layer].move(sprite, sprite.rect)
+        self.rank(sprite.z, sprite)
+        self.invalidate(sprite.z, sprite.rect)
+
+    def flush_pending(self):
+        for sprite in self.pending:
+            if sprite in self.spritedict and sprite not in self.sprite_layers:
+                self.layers[sprite.z].insert(sprite, sprite.rect)
+                self.invalidate(sprite.z, sprite.rect)
+                self.sprite_layers[sprite] = sprite.z
+                self.sprite_order[sprite] = self.added
+                self.added += 1
+                self.rank(sprite.z, sprite)
+                if getattr(sprite, 'moving', False):
+                    self.moving_sprites.add(sprite)
+                if type(sprite).update is not pygame.sprite.Sprite.update:
+                    self.updating[sprite] = None
+        self.pending.clear()
+
+    def rank(self, layer, sprite):
+        if layer in self.layer_ranks:
+            self.layer_ranks[layer][sprite] = None
+            self.unsorted_layers.add(layer)
+
+    def unrank(self, layer, sprite):
+        if layer in self.layer_ranks:
+            del self.layer_ranks[layer][sprite]
+
+    def sort_layers(self):
+        for layer in self.unsorted_layers:
+            order = sorted(self.layer_ranks[layer], key=lambda sprite: (sprite.rect.centery, self.sprite_order[sprite]))
+            self.layer_ranks[layer] = {sprite: rank for rank, sprite in enumerate(order)}
+        self.unsorted_layers.clear()
+
+    def add_renderer(self, layer, renderer):
+        self.renderers[layer].append(renderer)
+
+    def chunk_keys(self, rect):
+        left, top = rect.left // CHUNK_SIZE, rect.top // CHUNK_SIZE
+        right, bottom = (rect.right - 1) // CHUNK_SIZE, (rect.bottom - 1) // CHUNK_SIZE
+        for x in range(left, right + 1):
+            for y in range(top, bottom + 1):
+                yield x, y
+
+    def invalidate(self, layer, rect):
+        if layer in self.baked_layers:
+            self.dirty_chunks[layer].update(self.chunk_keys(rect))
+
+    def bake_chunk(self, layer, key):
+        chunk_rect = pygame.Rect(key[0] * CHUNK_SIZE, key[1] * CHUNK_SIZE, CHUNK_SIZE, CHUNK_SIZE)
+        sprites = self.visible_sprites(layer, chunk_rect)
+        if not sprites:
+            self.chunks[layer].pop(key, None)
+            return
+
+        # composite in premultiplied alpha so half transparent pixels blend like separate blits
+        chunk = pygame.Surface(chunk_rect.size, pygame.SRCALPHA)
+        for sprite in sprites:
+            pos = (sprite.rect.x - chunk_rect.x, sprite.rect.y - chunk_rect.y)
+            if sprite.image.get_flags() & pygame.SRCALPHA:
+                chunk.blit(sprite.image.premul_alpha(), pos, special_flags=pygame.BLEND_PREMULTIPLIED)
+            else:
+                chunk.blit(sprite.image, pos)
+        self.chunks[layer][key] = chunk
+
+    def draw_chunks(self, layer, camera_rect):
+        chunks = self.chunks[layer]
+        dirty = self.dirty_chunks[layer]
+        rebaked = []
+        for key in self.chunk_keys(camera_rect):
+            pos = (key[0] * CHUNK_SIZE - self.offset.x, key[1] * CHUNK_SIZE - self.offset.y)
+            if key in dirty:
+                self.bake_chunk(layer, key)
+                dirty.discard(key)
+                rebaked.append(pygame.Rect(pos, (CHUNK_SIZE, CHUNK_SIZE)))
+
+            if key in chunks:
+                self.display_surface.blit(chunks[key], pos, special_flags=pygame.BLEND_PREMULTIPLIED)
+
+        # chunks out of reach are rebaked if the camera comes back
+        keep = camera_rect.inflate(2 * BAKE_KEEP_DISTANCE * CHUNK_SIZE, 2 * BAKE_KEEP_DISTANCE * CHUNK_SIZE)
+        nearby = set(self.chunk_keys(keep))
+        for key in [key for key in chunks if key not in nearby]:
+            del chunks[key]
+            dirty.add(key)
+        return rebaked
+
+    def update(self, *args, **kwargs):
+        self.flush_pending()
+        for sprite in list(self.updating):
+            sprite.update(*args, **kwargs)
+
+    def visible_sprites(self, layer, camera_rect):
+        sprites = [sprite for sprite in self.layers[layer].query(camera_rect) if sprite.rect.colliderect(camera_rect)]
+        if layer in self.layer_ranks:
+            sprites.sort(key=self.layer_ranks[layer].__getitem__)
+        else:
+            sprites.sort(key=lambda sprite: (sprite.rect.centery, self.sprite_order[sprite]))
+        return sprites
+
     def custom_draw(self, player):
         self.offset.x = player.rect.centerx - SCREEN_WIDTH / 2
         self.offset.y = player.rect.centery - SCREEN_HEIGHT / 2
 
-        for layer in LAYERS.values():
-            for sprite in sorted(self.sprites(), key=lambda sprite: sprite.rect.centery):
-                if sprite.z == layer:
-                    offset_rect = sprite.image.get_rect(topleft=(sprite.rect.x - self.offset.x, sprite.rect.y - self.offset.y))
-                    self.display_surface.blit(sprite.image, offset_rect)
-
-                    if DEBUG:
-                        # analysis
-                        if sprite == player:
-                            pygame.draw.rect(self.display_surface, 'red', offset_rect, 5)
-                            hitbox_rect = player.hitbox.copy()
-                            hitbox_rect.center = offset_rect.center
-                            pygame.draw.rect(self.display_surface, 'green', hitbox_rect, 5)
-                            target_pos = offset_rect.center + PLAYER_TOOL_OFFSET[player.status.split('_')[0]]
-                            pygame.draw.circle(self.display_surface, 'blue', target_pos, 5)
+        self.flush_pending()
+        for sprite in self.moving_sprites:
+            self.layers[sprite.z].move(sprite, sprite.rect)
+        self.sort_layers()
+
+        camera_rect = pygame.Rect(int(self.offset.x), int(self.offset.y), SCREEN_WIDTH + 1, SCREEN_HEIGHT + 1)
+        drawn = {}
+        drawn_extra = []
+        for layer in self.layers:
+            if layer in self.baked_layers:
+                drawn_extra.extend(self.draw_chunks(layer, camera_rect))
+                continue
+
+            for sprite in self.visible_sprites(layer, camera_rect):
+                offset_rect = sprite.image.get_rect(topleft=(sprite.rect.x - self.offset.x, sprite.rect.y - self.offset.y))
+                self.display_surface.blit(sprite.image, offset_rect)
+                if DIRTY_RECTS:
+                    drawn[sprite] = (sprite.image, offset_rect)
+
+                if DEBUG:
+                    # analysis
+                    if sprite == player:
+                        pygame.draw.rect(self.display_surface, 'red', offset_rect, 5)
+                        hitbox_rect = player.hitbox.copy()
+                        hitbox_rect.center = offset_rect.center
+                        pygame.draw.rect(self.display_surface, 'green', hitbox_rect, 5)
+                        target_pos = offset_rect.center + PLAYER_TOOL_OFFSET[player.status.split('_')[0]]
+                        pygame.draw.circle(self.display_surface, 'blue', target_pos, 5)
+
+            for renderer in self.renderers[layer]:
+                drawn_extra.extend(renderer(self.display_surface, self.offset, camera_rect) or [])
+
+        if DIRTY_RECTS:
+            self.find_dirty(drawn, drawn_extra)
+
+    def find_dirty(self, drawn, drawn_extra):
+        # sprites whose image or screen position changed, plus anything drawn outside of sprites
+        dirty = drawn_extra + self.drawn_extra
+        previous = self.drawn
+        for sprite, (image, rect) in drawn.items():
+            old = previous.pop(sprite, None)
+            if not old or old[0] is not image or old[1] != rect:
+                dirty.append(rect)
+                if old:
+                    dirty.append(old[1])
+        dirty.extend(rect for _, rect in previous.values())
+
+        self.drawn = drawn
+        self.drawn_extra = drawn_extra
+        self.dirty = dirty
@@ -0,0 +1,114 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import contextmanager
+from os import walk, path as os_path
+from time import perf_counter
+
+import pygame
+from settings import *
+from support import asset_cache, asset_report, cache_key
+
+IMAGE_TYPES = ('.png', '.jpg', '.bmp')
+SOUND_TYPES = ('.wav', '.mp3', '.ogg')
+
+
+class Loader:
+    def __init__(self):
+        self.display_surface = pygame.display.get_surface()
+        self.font = pygame.font.Font('../font/LycheeSoda.ttf', 30)
+        self.timings = {}
+
+        # progress
+        self.done = 0
+        self.total = 0
+        self.last_draw = 0
+
+    @contextmanager
+    def timed(self, name):
+        start = perf_counter()
+        yield
+        self.timings[name] = self.timings.get(name, 0) + perf_counter() - start
+
+    def report(self):
+        lines = [f'{name:<24}{seconds * 1000:8.1f} ms' for name, seconds in self.timings.items()]
+
+        # lookups through the import functions; folder lists and anything not preloaded count as misses
+        assets = asset_report()
+        lines.append(f'{"asset cache entries":<24}{assets["entries"]:8d}')
+        lines.append(f'{"asset cache hit rate":<24}{assets["hit_rate"] * 100:8.1f} % ({assets["hits"]} hits, {assets["misses"]} misses)')
+        return '\n'.join(lines)
+
+    def scan(self):
+        jobs = []
+        for asset in PRELOAD_ASSETS:
+            if os_path.isdir(asset):
+                paths = [os_path.join(root, name) for root, _, names in walk(asset) for name in names]
+            else:
+                paths = [asset]
+
+            for file_path in paths:
+                extension = os_path.splitext(file_path)[1].lower()
+                if extension in IMAGE_TYPES:
+                    jobs.append(('image', file_path))
+                elif extension in SOUND_TYPES:
+                    jobs.append(('sound', file_path))
+        return jobs
+
+    @staticmethod
+    def decode(kind, path):
+        # worker thread: file reading and decoding only, nothing that needs the display
+        if kind == 'image':
+            return kind, path, pygame.image.load(path)
+        return kind, path, pygame.mixer.Sound(path)
+
+    def load(self, build_level):
+        with self.timed('scan'):
+            jobs = self.scan()
+        self.total = len(jobs) + 1
+
+        # decoded assets are converted on the main thread and stored under the keys the import functions use
+        with self.timed('assets'):
+            with ThreadPoolExecutor(PRELOAD_WORKERS, thread_name_prefix='preload') as pool:
+                pending = {pool.submit(self.decode, kind, path) for kind, path in jobs}
+                while pending:
+                    finished, pending = wait(pending, timeout=1 / 30, return_when=FIRST_COMPLETED)
+                    with self.timed('convert'):
+                        for future in finished:
+                            kind, path, asset = future.result()
+                            asset_cache[cache_key(kind, path)] = asset.convert_alpha() if kind == 'image' else asset
+                            self.done += 1
+                    self.draw('Loading')
+
+        self.draw('Building the farm', force=True)
+        with self.timed('level'):
+            level = build_level()
+        self.done += 1
+
+        for name, seconds in level.tile_map.timings.items():
+            self.timings[f'map {name}'] = seconds
+        return level
+
+    def draw(self, text, force=False):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                sys.exit()
+
+        # the screen only needs to keep up with the eye
+        now = perf_counter()
+        if not force and now - self.last_draw < 1 / 30:
+            return
+        self.last_draw = now
+
+        self.display_surface.fill('black')
+        text_surf = self.font.render(text, False, 'White')
+        text_rect = text_surf.get_rect(midbottom=(SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 - 20))
+        self.display_surface.blit(text_surf, text_rect)
+
+        bar_rect = pygame.Rect(0, 0, 400, 20)
+        bar_rect.midtop = (SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2)
+        progress_rect = bar_rect.copy()
+        progress_rect.width = bar_rect.width * self.done / max(self.total, 1)
+        pygame.draw.rect(self.display_surface, 'White', progress_rect, 0, 4)
+        pygame.draw.rect(self.display_surface, 'White', bar_rect, 2, 4)
+        pygame.display.update()
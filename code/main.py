@@ -1,28 +1,170 @@
-import pygame, sys
+import os, sys
+from argparse import ArgumentParser
+from time import perf_counter, process_time
+import pygame
 from settings import *
 from level import Level
+from loading import Loader
+from savegame import SaveGame
 
 
 class Game:
-    def __init__(self):
+    def __init__(self, headless=False, profile_path=None, fps=TARGET_FPS, vsync=VSYNC, adaptive=ADAPTIVE_FPS, show_fps=False, save_path=None, startup_timings=False):
+        self.start_time = perf_counter()
+        if headless:
+            # no window and no sound card needed, e.g. in CI
+            os.environ['SDL_VIDEODRIVER'] = 'dummy'
+            os.environ['SDL_AUDIODRIVER'] = 'dummy'
+
         pygame.init()
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+        self.screen = self.create_window(vsync and not headless)
         pygame.display.set_caption("Sprout land")
         self.clock = pygame.time.Clock()
-        self.level = Level()
+
+        # staged startup behind a loading screen
+        self.loader = Loader()
+        self.loader.timings['init'] = perf_counter() - self.start_time
+        self.level = self.loader.load(Level)
+        self.startup_timings = startup_timings
+        self.interactive = False
+
+        # frame pacing
+        self.fps = fps
+        self.adaptive = adaptive
+        self.focused = True
+        self.idle = False
+
+        # fps and cpu time report, once per second
+        self.show_fps = show_fps
+        self.report_frames = 0
+        self.report_cpu = 0
+        self.report_start = perf_counter()
+
+        self.profile_path = profile_path
+        if profile_path:
+            self.level.profiler.enabled = True
+
+        self.save_game = SaveGame(self.level, save_path) if save_path else None
+        if self.save_game:
+            with self.loader.timed('save load'):
+                self.save_game.load()
+
+    def create_window(self, vsync):
+        size = (SCREEN_WIDTH, SCREEN_HEIGHT)
+        if vsync:
+            # vsync needs a renderer backed window, which SCALED provides
+            try:
+                return pygame.display.set_mode(size, pygame.SCALED, vsync=1)
+            except pygame.error:
+                print('vsync is not available, using the frame cap instead')
+        return pygame.display.set_mode(size)
+
+    def frame_rate(self):
+        if self.adaptive and (not self.focused or self.idle):
+            return min(IDLE_FPS, self.fps) if self.fps else IDLE_FPS
+        return self.fps
+
+    def report(self, cpu_time):
+        self.level.profiler.record('frame cpu', cpu_time)
+        if not self.show_fps:
+            return
+
+        self.report_frames += 1
+        self.report_cpu += cpu_time
+        elapsed = perf_counter() - self.report_start
+        if elapsed >= 1:
+            fps = self.report_frames / elapsed
+            cpu_ms = self.report_cpu / self.report_frames * 1000
+            pygame.display.set_caption(f'Sprout land - {fps:.0f} fps, {cpu_ms:.1f} ms cpu per frame')
+            self.report_frames = 0
+            self.report_cpu = 0
+            self.report_start = perf_counter()
+
+    def startup_done(self):
+        self.interactive = True
+        self.loader.timings['time to interactive'] = perf_counter() - self.start_time
+        if self.startup_timings:
+            print(self.loader.report())
+
+    def quit(self):
+        if self.profile_path:
+            self.level.profiler.export(self.profile_path)
+        if self.save_game:
+            self.save_game.close()
+        pygame.quit()
+
+    def tick(self):
+        self.level.update(FIXED_DT)
+        if self.save_game:
+            self.save_game.update(FIXED_DT)
 
     def run(self):
+        accumulator = 0
         while True:
+            # the frame cap sleeps instead of spinning; the fixed timestep absorbs any frame time
+            accumulator += min(self.clock.tick(self.frame_rate()) / 1000, MAX_FRAME_TIME)
+            cpu_start = process_time()
+
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
-                    pygame.quit()
+                    self.quit()
                     sys.exit()
+                if event.type == pygame.WINDOWFOCUSLOST:
+                    self.focused = False
+                if event.type == pygame.WINDOWFOCUSGAINED:
+                    self.focused = True
+
+            # fixed timestep: the simulation advances the same way at any frame rate
+            while accumulator >= FIXED_DT:
+                self.tick()
+                accumulator -= FIXED_DT
 
-            dt = self.clock.tick() / 1000
-            self.level.run(dt)
-            pygame.display.update()
+            dirty = self.level.draw()
+            with self.level.profiler.section('display.update'):
+                pygame.display.update(dirty)
+            if not self.interactive:
+                self.startup_done()
+
+            # nothing redrawn or nothing moving: the next frames can wait longer
+            self.idle = dirty == [] or self.level.is_idle()
+            self.report(process_time() - cpu_start)
+            self.level.profiler.end_frame(self.level.sprite_counts)
+
+    def simulate(self, ticks, day_ticks=0):
+        self.startup_done()
+        start = perf_counter()
+        for tick in range(1, ticks + 1):
+            pygame.event.pump()
+            if day_ticks and tick % day_ticks == 0:
+                self.level.player.sleep = True
+            self.tick()
+            self.level.profiler.end_frame(self.level.sprite_counts)
+
+        elapsed = perf_counter() - start
+        ticks_per_second = ticks / elapsed if elapsed else float('inf')
+        print(f'{ticks} ticks ({ticks * FIXED_DT:.0f} simulated seconds) in {elapsed:.2f} s: {ticks_per_second:.0f} ticks/s')
+        self.quit()
+        return ticks_per_second
 
 
 if __name__ == '__main__':
-    game = Game()
-    game.run()
\ No newline at end of file
+    parser = ArgumentParser(description='Sprout land')
+    parser.add_argument('--headless', action='store_true', help='run the simulation without a window')
+    parser.add_argument('--ticks', type=int, default=SIMULATION_TPS * 600, help='ticks to simulate in headless mode')
+    parser.add_argument('--day-ticks', type=int, default=0, help='go to sleep every N ticks in headless mode')
+    parser.add_argument('--profile', metavar='PATH', help='profile every frame and write the trace to a .json or .csv file on exit')
+    parser.add_argument('--fps', type=int, default=TARGET_FPS, help='frame cap, 0 for uncapped')
+    parser.add_argument('--vsync', action='store_true', default=VSYNC, help='request vsync from the display')
+    parser.add_argument('--no-adaptive', dest='adaptive', action='store_false', default=ADAPTIVE_FPS, help=f'keep the frame cap instead of dropping to {IDLE_FPS} fps while idle')
+    parser.add_argument('--show-fps', action='store_true', help='show the achieved fps and cpu time per frame in the window title')
+    parser.add_argument('--save', metavar='PATH', help=f'save file, {SAVE_PATH} by default; headless runs only load and save when given')
+    parser.add_argument('--no-save', action='store_true', help='neither load nor write a save file')
+    parser.add_argument('--startup-timings', action='store_true', help='print the time spent in each startup phase')
+    args = parser.parse_args()
+
+    save_path = None if args.no_save else args.save or (None if args.headless else SAVE_PATH)
+    game = Game(args.headless, args.profile, args.fps, args.vsync, args.adaptive, args.show_fps, save_path, args.startup_timings)
+    if args.headless:
+        game.simulate(args.ticks, args.day_ticks)
+    else:
+        game.run()
@@ -25,6 +25,22 @@ class Menu:
         # movement
         self.index = 0
         self.timer = Timer(200)
+        self.get_keys = pygame.key.get_pressed
+
+        # retained drawing: text surfaces per value and the area drawn last time
+        self.amount_surfs = {}
+        self.money_rect = None
+
+    def amounts(self):
+        return list(self.player.item_inventory.values()) + list(self.player.seed_inventory.values())
+
+    def state(self):
+        return self.index, self.player.money, tuple(self.amounts())
+
+    def amount_surf(self, amount):
+        if amount not in self.amount_surfs:
+            self.amount_surfs[amount] = self.font.render(str(amount), False, 'Black')
+        return self.amount_surfs[amount]
 
     def display_money(self):
         text_surf = self.font.render(f'${self.player.money}', False, 'Black')
@@ -32,6 +48,7 @@ class Menu:
 
         pygame.draw.rect(self.display_surface, 'White', text_rect.inflate(10, 10), 0, 4)
         self.display_surface.blit(text_surf, text_rect)
+        return text_rect.inflate(10, 10)
 
     def setup(self):
         self.text_surfs = []
@@ -49,9 +66,9 @@ class Menu:
         self.buy_text = self.font.render('buy', False, 'Black')
         self.sell_text = self.font.render('sell', False, 'Black')
 
-    def input(self):
-        keys = pygame.key.get_pressed()
-        self.timer.update()
+    def input(self, dt):
+        keys = self.get_keys()
+        self.timer.update(dt)
 
         if keys[pygame.K_ESCAPE]:
             self.toggle_menu()
@@ -90,7 +107,7 @@ class Menu:
         text_rect = text_surf.get_rect(midleft=(self.main_rect.left + 20, bg_rect.centery))
         self.display_surface.blit(text_surf, text_rect)
 
-        amount_surf = self.font.render(str(amount), False, 'Black')
+        amount_surf = self.amount_surf(amount)
         amount_rect = amount_surf.get_rect(midright=(self.main_rect.right - 20, bg_rect.centery))
         self.display_surface.blit(amount_surf, amount_rect)
 
@@ -101,10 +118,16 @@ class Menu:
             else:
                 self.display_surface.blit(self.sell_text, (self.main_rect.centerx - self.sell_text.get_width() / 2, bg_rect.centery - self.sell_text.get_height() / 2))
 
-    def update(self):
-        self.input()
-        self.display_money()
+    def display(self):
+        # returns the screen areas touched since the previous call
+        dirty = [self.main_rect]
+        if self.money_rect:
+            dirty.append(self.money_rect)
+        self.money_rect = self.display_money()
+        dirty.append(self.money_rect)
+
+        amounts = self.amounts()
         for text_index, text_surf in enumerate(self.text_surfs):
             top = self.main_rect.top + text_index * (text_surf.get_height() + (self.padding * 2) + self.space)
-            amount_list = list(self.player.item_inventory.values()) + list(self.player.seed_inventory.values())
-            self.show_entry(text_surf, amount_list[text_index], top, self.index == text_index)
\ No newline at end of file
+            self.show_entry(text_surf, amounts[text_index], top, self.index == text_index)
+        return dirty
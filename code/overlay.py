@@ -1,5 +1,6 @@
 import pygame
 from settings import *
+from support import import_image
 
 
 class Overlay:
@@ -12,8 +13,12 @@ class Overlay:
 
         # imports
         overlay_path = '../graphics/overlay/'
-        self.tools_surf = {tool: pygame.image.load(f'{overlay_path}{tool}.png').convert_alpha() for tool in player.tools}
-        self.seeds_surf = {seed: pygame.image.load(f'{overlay_path}{seed}.png').convert_alpha() for seed in player.seeds}
+        self.tools_surf = {tool: import_image(f'{overlay_path}{tool}.png') for tool in player.tools}
+        self.seeds_surf = {seed: import_image(f'{overlay_path}{seed}.png') for seed in player.seeds}
+
+        # what was shown last and where, for dirty rect updates
+        self.shown = None
+        self.rects = []
 
     def display(self):
 
@@ -26,3 +31,10 @@ class Overlay:
         seed_surf = self.seeds_surf[self.player.selected_seed]
         seed_rect = seed_surf.get_rect(midbottom=OVERLAY_POSITIONS['seed'])
         self.display_surface.blit(seed_surf, seed_rect)
+
+        shown = (self.player.selected_tool, self.player.selected_seed)
+        rects = [tool_rect, seed_rect]
+        dirty = [] if shown == self.shown else self.rects + rects
+        self.shown = shown
+        self.rects = rects
+        return dirty
@@ -22,6 +22,7 @@ class Player(pygame.sprite.Sprite):
         self.direction = pygame.math.Vector2()
         self.pos = pygame.math.Vector2(self.rect.center)
         self.speed = 200
+        self.moving = True
 
         # collision
         self.hitbox = self.rect.copy().inflate((-126, -70))
@@ -65,7 +66,10 @@ class Player(pygame.sprite.Sprite):
         self.soil_layer = soil_layer
         self.toggle_shop = toggle_shop
 
-        self.watering = pygame.mixer.Sound('../audio/water.mp3')
+        # input source, replaced by scripted keys in benchmarks
+        self.get_keys = pygame.key.get_pressed
+
+        self.watering = import_sound('../audio/water.mp3')
         self.watering.set_volume(0.2)
 
     def import_assets(self):
@@ -109,7 +113,7 @@ class Player(pygame.sprite.Sprite):
             self.soil_layer.plant_seed(self.target_pos, self.selected_seed)
 
     def input(self):
-        keys = pygame.key.get_pressed()
+        keys = self.get_keys()
 
         if not self.timers['tool use'].active and not self.sleep:
             # movement
@@ -178,23 +182,22 @@ class Player(pygame.sprite.Sprite):
             self.status = self.status.split('_')[0] + '_' + self.selected_tool
 
     def collision(self, direction):
-        for sprite in self.collision_sprites.sprites():
-            if hasattr(sprite, 'hitbox'):
-                if sprite.hitbox.colliderect(self.hitbox):
-                    if direction == 'horizontal':
-                        if self.direction.x > 0: # moving right
-                            self.hitbox.right = sprite.hitbox.left
-                        if self.direction.x < 0: # moving left
-                            self.hitbox.left = sprite.hitbox.right
-                        self.rect.centerx = self.hitbox.centerx
-                        self.pos.x = self.hitbox.centerx
-                    if direction == 'vertical':
-                        if self.direction.y > 0: # moving down
-                            self.hitbox.bottom = sprite.hitbox.top
-                        if self.direction.y < 0: # moving up
-                            self.hitbox.top = sprite.hitbox.bottom
-                        self.rect.centery = self.hitbox.centery
-                        self.pos.y = self.hitbox.centery
+        for sprite in self.collision_sprites.nearby(self.hitbox):
+            if sprite.hitbox.colliderect(self.hitbox):
+                if direction == 'horizontal':
+                    if self.direction.x > 0: # moving right
+                        self.hitbox.right = sprite.hitbox.left
+                    if self.direction.x < 0: # moving left
+                        self.hitbox.left = sprite.hitbox.right
+                    self.rect.centerx = self.hitbox.centerx
+                    self.pos.x = self.hitbox.centerx
+                if direction == 'vertical':
+                    if self.direction.y > 0: # moving down
+                        self.hitbox.bottom = sprite.hitbox.top
+                    if self.direction.y < 0: # moving up
+                        self.hitbox.top = sprite.hitbox.bottom
+                    self.rect.centery = self.hitbox.centery
+                    self.pos.y = self.hitbox.centery
 
     def move(self, dt):
         # normalazing a vector (diagonal move speed)
@@ -213,14 +216,14 @@ class Player(pygame.sprite.Sprite):
         self.rect.centery = self.hitbox.centery
         self.collision('vertical')
 
-    def update_timers(self):
+    def update_timers(self, dt):
         for timer in self.timers.values():
-            timer.update()
+            timer.update(dt)
 
     def update(self, dt):
         self.input()
         self.get_status()
-        self.update_timers()
+        self.update_timers(dt)
         self.get_target_pos()
 
         self.move(dt)
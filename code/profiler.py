@@ -0,0 +1,97 @@
+import csv
+import json
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from time import perf_counter
+import pygame
+from settings import *
+
+
+class Profiler:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.display_surface = pygame.display.get_surface()
+        self.font = None
+
+        # rolling window of recent frames per stage and the full trace for export
+        self.samples = {}
+        self.trace = deque(maxlen=PROFILE_TRACE_FRAMES)
+        self.frame = {}
+        self.frame_index = 0
+
+    def section(self, name):
+        if not self.enabled:
+            return nullcontext()
+        return self.timed(name)
+
+    @contextmanager
+    def timed(self, name):
+        start = perf_counter()
+        yield
+        self.record(name, perf_counter() - start)
+
+    def record(self, name, seconds):
+        if self.enabled:
+            self.frame[name] = self.frame.get(name, 0) + seconds
+
+    def end_frame(self, sprite_counts):
+        if not self.enabled:
+            return
+
+        for name, seconds in self.frame.items():
+            if name not in self.samples:
+                self.samples[name] = deque(maxlen=PROFILE_WINDOW)
+            self.samples[name].append(seconds)
+
+        record = {'frame': self.frame_index}
+        record.update({name: round(seconds * 1000, 4) for name, seconds in self.frame.items()})
+        record.update(sprite_counts())
+        self.trace.append(record)
+
+        self.frame = {}
+        self.frame_index += 1
+
+    def percentiles(self, name):
+        samples = sorted(self.samples[name])
+        last = len(samples) - 1
+        return {f'p{p}': samples[round(last * p / 100)] * 1000 for p in (50, 95, 99)}
+
+    def report(self):
+        return {name: self.percentiles(name) for name in self.samples}
+
+    def display(self):
+        if not self.enabled or not self.samples:
+            return
+
+        if not self.font:
+            self.font = pygame.font.Font('../font/LycheeSoda.ttf', 20)
+
+        rows = [['stage', 'p50', 'p95', 'p99']]
+        for name, stats in self.report().items():
+            rows.append([name] + [f'{stats[p]:.2f}' for p in ('p50', 'p95', 'p99')])
+        if self.trace:
+            rows.extend([name, str(count)] for name, count in self.trace[-1].items() if name.startswith('sprites'))
+
+        line_height = self.font.get_linesize()
+        bg_rect = pygame.Rect(10, 10, 400, line_height * len(rows) + 10)
+        pygame.draw.rect(self.display_surface, 'White', bg_rect, 0, 4)
+        for row_index, row in enumerate(rows):
+            top = bg_rect.top + 5 + row_index * line_height
+            for column, text in zip(PROFILE_COLUMNS, row):
+                text_surf = self.font.render(text, False, 'Black')
+                self.display_surface.blit(text_surf, (bg_rect.left + column, top))
+
+    def export(self, path):
+        if path.endswith('.csv'):
+            fields = []
+            for record in self.trace:
+                for name in record:
+                    if name not in fields:
+                        fields.append(name)
+            with open(path, 'w', newline='') as file:
+                writer = csv.DictWriter(file, fields)
+                writer.writeheader()
+                writer.writerows(self.trace)
+        else:
+            with open(path, 'w') as file:
+                json.dump({'summary': self.report(), 'frames': list(self.trace)}, file)
@@ -0,0 +1,311 @@
+import json
+import os
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from time import time_ns
+
+import numpy as np
+import pygame
+from settings import *
+
+SAVE_MAGIC = b'SPSV'
+JOURNAL_MAGIC = b'SPSJ'
+SAVE_VERSION = 1
+SAVE_HEADER = struct.Struct('<4sHI')
+JOURNAL_HEADER = struct.Struct('<4sHQ')
+RECORD_HEADER = struct.Struct('<II')
+
+# what a damaged save or journal can raise while it is decoded and replayed
+LOAD_ERRORS = (ValueError, KeyError, TypeError, IndexError, json.JSONDecodeError, struct.error, zlib.error)
+
+
+def pack(arrays):
+    # raw array bytes back to back, described by [name, dtype, shape, offset] entries
+    layout = []
+    blob = bytearray()
+    for name, array in arrays.items():
+        layout.append([name, array.dtype.str, list(array.shape), len(blob)])
+        blob += array.tobytes()
+    return layout, bytes(blob)
+
+
+def unpack(layout, data):
+    blob = zlib.decompress(data)
+    arrays = {}
+    for name, dtype, shape, offset in layout:
+        count = int(np.prod(shape))
+        arrays[name] = np.frombuffer(blob, dtype, count, offset).reshape(shape).copy()
+    return arrays
+
+
+class SaveGame:
+    def __init__(self, level, path=SAVE_PATH):
+        self.level = level
+        self.path = path
+        self.journal_path = path + '.journal'
+
+        # state as of the last write, autosaves only record what differs from it
+        self.saved = None
+        self.snapshot = None
+        self.autosaves = 0
+        self.elapsed = 0
+
+        # a single writer thread keeps the writes in order and off the frame loop
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='savegame')
+        self.writes = []
+
+        # snapshot the journal on disk belongs to, only touched by the writer thread
+        self.written_snapshot = None
+
+    def capture(self):
+        level = self.level
+        player = level.player
+        kinds, ages = level.soil_layer.crop_grids()
+        grids = {'cells': level.soil_layer.grid.cells.copy(), 'kinds': kinds, 'ages': ages}
+        meta = {
+            'player': {
+                'pos': [player.pos.x, player.pos.y],
+                'status': player.status,
+                'money': player.money,
+                'items': dict(player.item_inventory),
+                'seeds': dict(player.seed_inventory)
+            },
+            'trees': [
+                [tree.health, tree.alive, [list(apple.rect.topleft) for apple in tree.apple_sprites]]
+                for tree in level.tree_sprites],
+            'raining': level.raining,
+            'sky': list(level.sky.start_color)
+        }
+        return meta, grids
+
+    def save(self):
+        meta, grids = self.capture()
+        layout, blob = pack(grids)
+        header = {'snapshot': time_ns(), 'grids': layout, 'state': meta}
+        self.saved = (meta, grids)
+        self.snapshot = header['snapshot']
+        self.autosaves = 0
+        self.writes.append(self.writer.submit(self.write_snapshot, json.dumps(header).encode(), header['snapshot'], blob))
+
+    def autosave(self):
+        if not self.saved or self.autosaves >= SNAPSHOT_EVERY:
+            self.save()
+            return
+
+        meta, grids = self.capture()
+        saved_meta, saved_grids = self.saved
+
+        # changed cells as flat indices and their new values
+        changes = {}
+        for name, grid in grids.items():
+            changed = np.flatnonzero(grid.ravel() != saved_grids[name].ravel()).astype(np.uint32)
+            changes[f'{name} index'] = changed
+            changes[name] = grid.ravel()[changed]
+
+        record = {'raining': meta['raining'], 'sky': meta['sky']}
+        if meta['player'] != saved_meta['player']:
+            record['player'] = meta['player']
+        record['trees'] = {index: tree for index, (tree, saved) in enumerate(zip(meta['trees'], saved_meta['trees'])) if tree != saved}
+        record['grids'], blob = pack(changes)
+
+        self.saved = (meta, grids)
+        self.autosaves += 1
+        self.writes.append(self.writer.submit(self.write_record, self.snapshot, json.dumps(record).encode(), blob))
+
+    def check_writes(self):
+        failed = None
+        for future in [future for future in self.writes if future.done()]:
+            self.writes.remove(future)
+            try:
+                future.result()
+            except OSError as error:
+                failed = error
+
+        # the diff base never reached the disk, the next autosave writes a full snapshot
+        if failed:
+            print(f'saving to {self.path} failed: {failed}')
+            self.saved = None
+
+    def write_snapshot(self, header, snapshot, blob):
+        self.written_snapshot = None
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+        # replaced in one step, so a crash mid-write leaves the previous save intact
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'wb') as file:
+            file.write(SAVE_HEADER.pack(SAVE_MAGIC, SAVE_VERSION, len(header)))
+            file.write(header)
+            file.write(zlib.compress(blob))
+        os.replace(temp_path, self.path)
+
+        with open(self.journal_path, 'wb') as file:
+            file.write(JOURNAL_HEADER.pack(JOURNAL_MAGIC, SAVE_VERSION, snapshot))
+        self.written_snapshot = snapshot
+
+    def write_record(self, snapshot, record, blob):
+        # a record only extends the journal of the snapshot it was diffed against
+        if snapshot != self.written_snapshot:
+            raise OSError('journal does not match the last written snapshot')
+
+        blob = zlib.compress(blob)
+        try:
+            with open(self.journal_path, 'ab') as file:
+                file.write(RECORD_HEADER.pack(len(record), len(blob)))
+                file.write(record)
+                file.write(blob)
+        except OSError:
+            self.written_snapshot = None
+            raise
+
+    def read_journal(self, snapshot):
+        # records plus whether the journal ended cleanly after the last of them
+        try:
+            with open(self.journal_path, 'rb') as file:
+                data = file.read()
+        except OSError:
+            return [], False
+
+        if len(data) < JOURNAL_HEADER.size:
+            return [], False
+        magic, version, journal_snapshot = JOURNAL_HEADER.unpack_from(data)
+        if magic != JOURNAL_MAGIC or version != SAVE_VERSION or journal_snapshot != snapshot:
+            return [], False
+
+        records = []
+        offset = JOURNAL_HEADER.size
+        while offset + RECORD_HEADER.size <= len(data):
+            record_length, blob_length = RECORD_HEADER.unpack_from(data, offset)
+            start = offset + RECORD_HEADER.size
+            end = start + record_length + blob_length
+            # a record cut short by a crash ends the journal
+            if end > len(data):
+                return records, False
+
+            try:
+                record = json.loads(data[start:start + record_length])
+                records.append((record, unpack(record['grids'], data[start + record_length:end])))
+            except LOAD_ERRORS:
+                return records, False
+            offset = end
+        return records, offset == len(data)
+
+    def replay(self, meta, grids, record, changes):
+        # checked in full before anything changes, so a bad record leaves the state as it was
+        trees = {int(index): tree for index, tree in record['trees'].items()}
+        if any(not 0 <= index < len(meta['trees']) for index in trees):
+            raise IndexError('tree index out of range')
+        for name, grid in grids.items():
+            index = changes[f'{name} index']
+            if len(index) != len(changes[name]) or (len(index) and index.max() >= grid.size):
+                raise IndexError(f'{name} index out of range')
+        state = {'raining': record['raining'], 'sky': record['sky']}
+        if 'player' in record:
+            state['player'] = record['player']
+
+        meta.update(state)
+        for index, tree in trees.items():
+            meta['trees'][index] = tree
+        for name, grid in grids.items():
+            grid.ravel()[changes[f'{name} index']] = changes[name]
+
+    def load(self):
+        try:
+            with open(self.path, 'rb') as file:
+                data = file.read()
+        except OSError:
+            return False
+
+        # a damaged save is reported and skipped, the game starts fresh instead
+        try:
+            meta, grids, snapshot = self.read_snapshot(data)
+        except LOAD_ERRORS as error:
+            print(f'save {self.path} could not be loaded: {error!r}')
+            return False
+
+        records, clean = self.read_journal(snapshot)
+        replayed = 0
+        for record, changes in records:
+            try:
+                self.replay(meta, grids, record, changes)
+            except LOAD_ERRORS:
+                clean = False
+                break
+            replayed += 1
+        if not clean:
+            print(f'journal {self.journal_path} is missing or damaged, replayed {replayed} records')
+
+        self.apply(meta, grids)
+        self.saved = (meta, grids)
+        self.snapshot = snapshot
+        # appending after a damaged tail would hide the new records, start over with a snapshot
+        self.written_snapshot = snapshot if clean else None
+        self.autosaves = replayed if clean else SNAPSHOT_EVERY
+        return True
+
+    def read_snapshot(self, data):
+        if len(data) < SAVE_HEADER.size:
+            raise ValueError('file is shorter than its header')
+        magic, version, header_length = SAVE_HEADER.unpack_from(data)
+        if magic != SAVE_MAGIC or version != SAVE_VERSION:
+            raise ValueError(f'not a version {SAVE_VERSION} save')
+
+        header_end = SAVE_HEADER.size + header_length
+        header = json.loads(data[SAVE_HEADER.size:header_end])
+        meta = header['state']
+        grids = unpack(header['grids'], data[header_end:])
+
+        # the map the save was made on must match this one before anything is applied
+        shape = self.level.soil_layer.grid.cells.shape
+        if any(grids[name].shape != shape for name in ('cells', 'kinds', 'ages')):
+            raise ValueError(f'soil grid is {grids["cells"].shape}, the map needs {shape}')
+        if grids['kinds'].max(initial=0) > len(CROP_TYPES):
+            raise ValueError('unknown crop kind')
+        return meta, grids, header['snapshot']
+
+    def apply(self, meta, grids):
+        level = self.level
+
+        player = level.player
+        state = meta['player']
+        player.pos.update(state['pos'])
+        player.hitbox.center = (round(player.pos.x), round(player.pos.y))
+        player.rect.center = player.hitbox.center
+        player.status = state['status']
+        player.money = state['money']
+        player.item_inventory.update(state['items'])
+        player.seed_inventory.update(state['seeds'])
+
+        level.raining = meta['raining']
+        level.soil_layer.raining = level.raining
+        level.sky.start_color = list(meta['sky'])
+
+        # trees are matched by map order, a changed map keeps its fresh trees
+        trees = level.tree_sprites.sprites()
+        if len(trees) == len(meta['trees']):
+            for tree, (health, alive, apples) in zip(trees, meta['trees']):
+                tree.health = health
+                if tree.alive and not alive:
+                    tree.die()
+                for apple in tree.apple_sprites.sprites():
+                    apple.kill()
+                for pos in apples:
+                    tree.add_fruit(pos)
+
+        visible_rect = pygame.Rect(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT)
+        visible_rect.center = player.rect.center
+        level.soil_layer.restore(grids['cells'], grids['kinds'], grids['ages'], visible_rect)
+
+    def update(self, dt):
+        self.elapsed += dt
+        if self.elapsed >= AUTOSAVE_INTERVAL:
+            self.elapsed = 0
+            self.check_writes()
+            self.autosave()
+
+    def close(self):
+        self.save()
+        self.writer.shutdown(wait=True)
+        self.check_writes()
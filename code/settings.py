@@ -4,6 +4,65 @@ SCREEN_WIDTH = 1280
 SCREEN_HEIGHT = 720
 TILE_SIZE = 64
 
+# simulation
+SIMULATION_TPS = 60
+FIXED_DT = 1 / SIMULATION_TPS
+MAX_FRAME_TIME = 0.25
+
+# frame pacing, 0 fps means uncapped; idle frames are throttled while unfocused or when nothing moves
+TARGET_FPS = 60
+IDLE_FPS = 15
+VSYNC = False
+ADAPTIVE_FPS = True
+
+# profiling
+PROFILE_WINDOW = 300
+PROFILE_TRACE_FRAMES = 36000
+PROFILE_COLUMNS = [5, 225, 285, 345]
+
+# spatial index
+GRID_CELL_SIZE = TILE_SIZE * 4
+
+# map loading
+MAP_CACHE = True
+
+# save games, autosaves are journal records on top of the last full snapshot
+SAVE_PATH = '../saves/save.bin'
+AUTOSAVE_INTERVAL = 60
+SNAPSHOT_EVERY = 10
+LOAD_BATCH = 32
+
+# startup preloading: the images and sounds the level asks for, decoded on worker threads.
+# Folders are walked, files are taken as they are; the map tilesets are loaded by the map itself
+PRELOAD_ASSETS = [
+	'../graphics/character',
+	'../graphics/fruit',
+	'../graphics/overlay',
+	'../graphics/rain',
+	'../graphics/soil',
+	'../graphics/soil_water',
+	'../graphics/stumps',
+	'../graphics/water',
+	'../graphics/world/ground.png',
+	'../audio/axe.mp3',
+	'../audio/hoe.wav',
+	'../audio/music.mp3',
+	'../audio/plant.wav',
+	'../audio/success.wav',
+	'../audio/water.mp3']
+PRELOAD_WORKERS = 4
+
+# static layer baking, off by default as chunk blits measured no faster than the tiles they replace;
+# the ground is a single surface already. Chunks further than BAKE_KEEP_DISTANCE from the camera are dropped
+BAKE_STATIC_LAYERS = False
+CHUNK_SIZE = 512
+BAKED_LAYERS = ['house bottom']
+BAKE_KEEP_DISTANCE = 1
+
+# dirty rect display updates, above the limit or half the screen a full update is used
+DIRTY_RECTS = False
+DIRTY_RECT_LIMIT = 32
+
 # overlay positions
 OVERLAY_POSITIONS = {
 	'tool' : (40, SCREEN_HEIGHT - 15),
@@ -16,6 +75,10 @@ PLAYER_TOOL_OFFSET = {
 	'down': Vector2(0,50)
 }
 
+# rain particles per second and pool size, for the floor splashes and the drops each
+RAIN_SPAWN_RATE = 600
+RAIN_CAPACITY = 512
+
 LAYERS = {
 	'water': 0,
 	'ground': 1,
@@ -39,6 +102,7 @@ GROW_SPEED = {
 	'corn': 1,
 	'tomato': 0.7
 }
+CROP_TYPES = list(GROW_SPEED)
 
 SALE_PRICES = {
 	'wood': 4,
@@ -1,8 +1,7 @@
 import pygame
+import numpy as np
 from settings import *
 from support import *
-from sprites import Generic
-from random import randint, choice
 
 
 class Sky:
@@ -11,37 +10,85 @@ class Sky:
         self.full_surf = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
         self.start_color = [255, 255, 255]
         self.end_color = (38, 101, 189)
+        self.tint = None
 
-    def display(self, dt):
+    def update(self, dt):
         for index, value in enumerate(self.end_color):
             if self.start_color[index] > value:
                 self.start_color[index] -= 2 * dt
 
-        self.full_surf.fill(self.start_color)
-        self.display_surface.blit(self.full_surf, (0, 0), special_flags=pygame.BLEND_RGBA_MULT)
+    def get_tint(self):
+        # fill truncates to whole colour steps
+        return tuple(int(value) for value in self.start_color)
 
+    def display(self):
+        # refill only when a colour step changes; white is a no-op
+        tint = self.get_tint()
+        if tint == (255, 255, 255):
+            return
 
-class Drop(Generic):
-    def __init__(self, pos, surf, moving, groups, z):
+        if tint != self.tint:
+            self.full_surf.fill(tint)
+            self.tint = tint
+        self.display_surface.blit(self.full_surf, (0, 0), special_flags=pygame.BLEND_RGBA_MULT)
 
-        # setup
-        super().__init__(pos, surf, groups, z)
-        self.lifetime = randint(400, 500)
-        self.start_time = pygame.time.get_ticks()
 
-        # moving
+class RainParticles:
+    def __init__(self, frames, capacity, rate, moving):
+        self.frames = frames
+        self.rate = rate
         self.moving = moving
+        self.spawn_credit = 0
+        self.rng = np.random.default_rng()
+
+        # fixed pool, one slot per particle
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.pos = np.zeros((capacity, 2), dtype=np.float32)
+        self.velocity = np.zeros((capacity, 2), dtype=np.float32)
+        self.age = np.zeros(capacity, dtype=np.float32)
+        self.lifetime = np.zeros(capacity, dtype=np.float32)
+        self.frame = np.zeros(capacity, dtype=np.int32)
+        self.sizes = np.array([frame.get_size() for frame in frames], dtype=np.float32)
+
+    def spawn(self, dt, area):
+        # spawning by rate keeps the rain density the same at any tick rate
+        self.spawn_credit += self.rate * dt
+        amount = int(self.spawn_credit)
+        self.spawn_credit -= amount
+
+        slots = np.flatnonzero(~self.alive)[:amount]
+        count = len(slots)
+        if not count:
+            return
+
+        self.alive[slots] = True
+        self.age[slots] = 0
+        self.lifetime[slots] = self.rng.integers(400, 501, count) / 1000
+        self.frame[slots] = self.rng.integers(0, len(self.frames), count)
+        self.pos[slots, 0] = self.rng.integers(0, area[0] + 1, count)
+        self.pos[slots, 1] = self.rng.integers(0, area[1] + 1, count)
         if self.moving:
-            self.pos = pygame.math.Vector2(self.rect.topleft)
-            self.direction = pygame.math.Vector2(-2, 4)
-            self.speed = randint(200, 250)
+            speed = self.rng.integers(200, 251, count)
+            self.velocity[slots, 0] = -2 * speed
+            self.velocity[slots, 1] = 4 * speed
 
     def update(self, dt):
         if self.moving:
-            self.pos += self.direction * self.speed * dt
-            self.rect.topleft = (round(self.pos.x), round(self.pos.y))
-        if pygame.time.get_ticks() - self.start_time >= self.lifetime:
-            self.kill()
+            self.pos[self.alive] += self.velocity[self.alive] * dt
+        self.age[self.alive] += dt
+        self.alive &= self.age < self.lifetime
+
+    def draw(self, surface, offset, camera_rect):
+        pos = np.round(self.pos)
+        size = self.sizes[self.frame]
+        visible = self.alive & (pos[:, 0] + size[:, 0] > camera_rect.left) & (pos[:, 0] < camera_rect.right) \
+            & (pos[:, 1] + size[:, 1] > camera_rect.top) & (pos[:, 1] < camera_rect.bottom)
+
+        frames = self.frames
+        return surface.blits([
+            (frames[frame], (x - offset.x, y - offset.y))
+            for (x, y), frame in zip(pos[visible].tolist(), self.frame[visible].tolist())
+        ])
 
 
 class Rain:
@@ -51,26 +98,18 @@ class Rain:
         self.rain_drops = import_folder('../graphics/rain/drops/')
         self.rain_floor = import_folder('../graphics/rain/floor/')
 
-        self.floor_w, self.floor_h = pygame.image.load('../graphics/world/ground.png').get_size()
-
-    def create_floor(self):
-        Drop(
-            pos = (randint(0, self.floor_w), randint(0, self.floor_h)),
-            surf = choice(self.rain_floor),
-            moving = False,
-            groups = self.all_sprites,
-            z = LAYERS['rain floor']
-        )
-
-    def create_drops(self):
-        Drop(
-            pos = (randint(0, self.floor_w), randint(0, self.floor_h)),
-            surf = choice(self.rain_drops),
-            moving = True,
-            groups = self.all_sprites,
-            z = LAYERS['rain drops']
-        )
-
-    def update(self):
-        self.create_floor()
-        self.create_drops()
\ No newline at end of file
+        self.floor_w, self.floor_h = import_image('../graphics/world/ground.png').get_size()
+
+        self.floor = RainParticles(self.rain_floor, RAIN_CAPACITY, RAIN_SPAWN_RATE, moving=False)
+        self.drops = RainParticles(self.rain_drops, RAIN_CAPACITY, RAIN_SPAWN_RATE, moving=True)
+        self.all_sprites.add_renderer(LAYERS['rain floor'], self.floor.draw)
+        self.all_sprites.add_renderer(LAYERS['rain drops'], self.drops.draw)
+
+    def count(self):
+        return int(self.floor.alive.sum() + self.drops.alive.sum())
+
+    def update(self, dt, raining):
+        for particles in (self.floor, self.drops):
+            if raining:
+                particles.spawn(dt, (self.floor_w, self.floor_h))
+            particles.update(dt)
@@ -1,8 +1,116 @@
 import pygame
 import random
+from collections import deque
+import numpy as np
 from settings import *
 from support import *
-from pytmx.util_pygame import load_pygame
+
+
+# soil cell flags
+FARMABLE = 1
+TILLED = 2
+WATERED = 4
+PLANTED = 8
+
+# neighbour bits of the soil autotile mask: t, b, r, l, tl, tr, bl, br
+NEIGHBOURS = [(0, -1), (0, 1), (1, 0), (-1, 0), (-1, -1), (1, -1), (-1, 1), (1, 1)]
+
+
+def soil_tile_type(mask):
+    t, b, r, l, tl, tr, bl, br = [bool(mask & (1 << bit)) for bit in range(8)]
+
+    tile_type = 'o'
+
+    # all sides
+    if all([t, b, r, l]): tile_type = 'x'
+
+    # horizontal tiles only
+    if l and not any([t, b, r]): tile_type = 'r'
+    if r and not any([t, b, l]): tile_type = 'l'
+    if r and l and not any([t, b]): tile_type = 'lr'
+
+    # vertical tiles only
+    if t and not any([r, l, b]): tile_type = 'b'
+    if b and not any([r, l, t]): tile_type = 't'
+    if b and t and not any([r, l]): tile_type = 'tb'
+
+    # corners
+    if r and b and not any([l, t]): tile_type = 'tl'
+    if l and b and not any([r, t]): tile_type = 'tr'
+    if r and t and not any([l, b]): tile_type = 'bl'
+    if l and t and not any([r, b]): tile_type = 'br'
+
+    # T shapes
+    if all([t, b, r]) and not l: tile_type = 'tbr'
+    if all([t, b, l]) and not r: tile_type = 'tbl'
+    if all([r, l, b]) and not t: tile_type = 'lrt'
+    if all([r, l, t]) and not b: tile_type = 'lrb'
+
+    # middle
+    if all([l, r, b, bl, br]) and not t: tile_type = 'tm'
+    if all([l, r, t, tl, tr]) and not b: tile_type = 'bm'
+    if all([t, b, l, tl, bl]) and not r: tile_type = 'rm'
+    if all([t, b, r, tr, br]) and not l: tile_type = 'lm'
+
+    if all([l, r, b, bl]) and not t: tile_type = 'tm'
+    if all([l, r, t, tl]) and not b: tile_type = 'bm'
+    if all([t, b, l, tl]) and not r: tile_type = 'rm'
+    if all([t, b, r, tr]) and not l: tile_type = 'lm'
+
+    if all([l, r, b, br]) and not t: tile_type = 'tm'
+    if all([l, r, t, tr]) and not b: tile_type = 'bm'
+    if all([t, b, l, bl]) and not r: tile_type = 'rm'
+    if all([t, b, r, br]) and not l: tile_type = 'lm'
+
+    return tile_type
+
+
+# tile type for every neighbour mask
+SOIL_TILE_TYPES = [soil_tile_type(mask) for mask in range(256)]
+
+
+class SoilGrid:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.cells = np.zeros((height, width), dtype=np.uint8)
+
+    def inside(self, x, y):
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def has(self, x, y, flag):
+        return self.inside(x, y) and bool(self.cells[y, x] & flag)
+
+    def set(self, x, y, flag):
+        self.cells[y, x] |= flag
+
+    def clear(self, x, y, flag):
+        self.cells[y, x] &= ~flag & 0xFF
+
+    def clear_all(self, flag):
+        self.cells &= ~flag & 0xFF
+
+    def tile_masks(self, flag):
+        # 8-neighbour bitmask of every cell, built from shifted views of the padded grid
+        present = np.pad((self.cells & flag) != 0, 1).astype(np.uint8)
+        masks = np.zeros_like(self.cells)
+        for bit, (dx, dy) in enumerate(NEIGHBOURS):
+            masks |= present[1 + dy:1 + dy + self.height, 1 + dx:1 + dx + self.width] << bit
+        return masks
+
+    def tile_mask(self, x, y, flag):
+        mask = 0
+        for bit, (dx, dy) in enumerate(NEIGHBOURS):
+            if self.has(x + dx, y + dy, flag):
+                mask |= 1 << bit
+        return mask
+
+    def find(self, flag, without=0):
+        mask = (self.cells & flag) == flag
+        if without:
+            mask &= (self.cells & without) == 0
+        ys, xs = np.nonzero(mask)
+        return zip(xs.tolist(), ys.tolist())
 
 
 class SoilTile(pygame.sprite.Sprite):
@@ -23,212 +131,291 @@ class WaterTile(pygame.sprite.Sprite):
 
 
 class Plant(pygame.sprite.Sprite):
-    def __init__(self, plant_type, groups, soil, check_watered):
+    def __init__(self, plant_type, groups, soil):
         super().__init__(groups)
         self.plant_type = plant_type
         self.frames = import_folder(f'../graphics/fruit/{plant_type}')
         self.soil = soil
-        self.check_watered = check_watered
 
-        self.age = 0
+        self.stage = 0
         self.max_age = len(self.frames) - 1
         self.grow_speed = GROW_SPEED[plant_type]
         self.harvestable = False
 
-        self.image = self.frames[self.age]
+        self.image = self.frames[self.stage]
         self.y_offset = -16 if plant_type == 'corn' else -8
         self.rect = self.image.get_rect(midbottom = self.soil.rect.midbottom + pygame.math.Vector2(0, self.y_offset))
         self.z = LAYERS['ground plant']
 
-    def grow(self):
-        if self.check_watered(self.soil):
-            self.age += self.grow_speed
-
-            if int(self.age) > 0:
-                self.z = LAYERS['main']
-                self.hitbox = self.rect.copy().inflate(-26, -self.rect.height * 0.4)
+    def refresh(self):
+        for group in self.groups():
+            if hasattr(group, 'refresh'):
+                group.refresh(self)
 
-            if self.age >= self.max_age:
-                self.age = self.max_age
-                self.harvestable = True
+    def set_stage(self, stage):
+        self.stage = stage
+        self.image = self.frames[stage]
+        self.rect = self.image.get_rect(midbottom = self.soil.rect.midbottom + pygame.math.Vector2(0, self.y_offset))
 
-            self.image = self.frames[int(self.age)]
-            self.rect = self.image.get_rect(midbottom = self.soil.rect.midbottom + pygame.math.Vector2(0, self.y_offset))
+        if stage > 0:
+            self.z = LAYERS['main']
+            self.hitbox = self.rect.copy().inflate(-26, -self.rect.height * 0.4)
+
+        self.harvestable = stage >= self.max_age
+        self.refresh()
+
+
+class CropTable:
+    COLUMNS = ('kind', 'age', 'grow_speed', 'max_age', 'x', 'y')
+
+    def __init__(self, capacity=64):
+        self.size = 0
+
+        # one row per plant; removing a row moves the last one into its place
+        self.kind = np.zeros(capacity, dtype=np.uint8)
+        self.age = np.zeros(capacity, dtype=np.float64)
+        self.grow_speed = np.zeros(capacity, dtype=np.float64)
+        self.max_age = np.zeros(capacity, dtype=np.float64)
+        self.x = np.zeros(capacity, dtype=np.int32)
+        self.y = np.zeros(capacity, dtype=np.int32)
+        self.plants = []
+        self.rows = {}
+
+    def __len__(self):
+        return self.size
+
+    def grow_capacity(self):
+        for name in self.COLUMNS:
+            column = getattr(self, name)
+            setattr(self, name, np.concatenate([column, np.zeros_like(column)]))
+
+    def add(self, plant, x, y):
+        if self.size == len(self.age):
+            self.grow_capacity()
+
+        row = self.size
+        self.kind[row] = CROP_TYPES.index(plant.plant_type)
+        self.age[row] = 0
+        self.grow_speed[row] = plant.grow_speed
+        self.max_age[row] = plant.max_age
+        self.x[row] = x
+        self.y[row] = y
+        self.plants.append(plant)
+        self.rows[plant] = row
+        self.size += 1
+
+    def remove(self, plant):
+        row = self.rows.pop(plant)
+        last = self.size - 1
+        if row != last:
+            for name in self.COLUMNS:
+                column = getattr(self, name)
+                column[row] = column[last]
+            moved = self.plants[last]
+            self.plants[row] = moved
+            self.rows[moved] = row
+        self.plants.pop()
+        self.size -= 1
+
+    def grow(self, watered_cells):
+        # one vectorized growth step, returns the rows whose integer stage changed
+        n = self.size
+        age = self.age[:n]
+        watered = watered_cells[self.y[:n], self.x[:n]]
+        old_stage = age.astype(np.int32)
+        np.copyto(age, np.minimum(age + self.grow_speed[:n], self.max_age[:n]), where=watered)
+        return np.flatnonzero(age.astype(np.int32) != old_stage)
 
 
 class SoilLayer:
-    def __init__(self, all_sprites, collision_sprites):
+    def __init__(self, all_sprites, collision_sprites, tile_map):
 
         # sprites groups
         self.all_sprites = all_sprites
         self.collision_sprites = collision_sprites
+        self.tile_map = tile_map
         self.soil_sprites = pygame.sprite.Group()
         self.water_sprites = pygame.sprite.Group()
         self.plant_sprites = pygame.sprite.Group()
 
+        # per-cell lookups for tool targets
+        self.soil_tiles = {}
+        self.water_tiles = {}
+        self.plants = {}
+
+        # crop state as columns, so the overnight growth is one pass
+        self.crops = CropTable()
+        # plants grown into a new stage since their sprite was last updated; rows move on removal
+        self.stale_plants = set()
+
+        # restored cells still waiting for their sprites, nearest to the player first
+        self.pending_cells = deque()
+        self.pending_crops = None
+
         # graphics
         self.soil_surfs = import_folder_dict('../graphics/soil')
         self.soil_water_sprites = import_folder('../graphics/soil_water')
 
         self.create_soil_grid()
-        self.create_hit_rects()
 
-        self.hoe_sound = pygame.mixer.Sound('../audio/hoe.wav')
+        self.hoe_sound = import_sound('../audio/hoe.wav')
         self.hoe_sound.set_volume(0.1)
-        self.plant_sound = pygame.mixer.Sound('../audio/plant.wav')
+        self.plant_sound = import_sound('../audio/plant.wav')
         self.plant_sound.set_volume(0.1)
 
     def create_soil_grid(self):
-        ground = pygame.image.load('../graphics/world/ground.png')
+        ground = import_image('../graphics/world/ground.png')
         h_tiles, v_tiles = ground.get_width() // TILE_SIZE, ground.get_height() // TILE_SIZE
 
-        self.grid = [[[] for col in range(h_tiles)] for row in range(v_tiles)]
+        self.grid = SoilGrid(h_tiles, v_tiles)
 
-        for x, y, _ in load_pygame('../data/map.tmx').get_layer_by_name('Farmable').tiles():
-            self.grid[y][x].append('F')
+        with self.tile_map.timed('Farmable'):
+            for x, y, _ in self.tile_map.tiles('Farmable'):
+                self.grid.set(x, y, FARMABLE)
 
-    def create_hit_rects(self):
-        self.hit_rects = []
-        for index_row, row in enumerate(self.grid):
-            for index_col, cell in enumerate(row):
-                if 'F' in cell:
-                    x = index_col * TILE_SIZE
-                    y = index_row * TILE_SIZE
-                    rect = pygame.Rect(x, y, TILE_SIZE, TILE_SIZE)
-                    self.hit_rects.append(rect)
+    def get_cell(self, point):
+        return int(point[0] // TILE_SIZE), int(point[1] // TILE_SIZE)
 
     def get_hit(self, point):
-        for rect in self.hit_rects:
-            if rect.collidepoint(point):
-                self.hoe_sound.play()
-                x = rect.x // TILE_SIZE
-                y = rect.y // TILE_SIZE
-
-                if 'F' in self.grid[y][x]:
-                    self.grid[y][x].append('X')
-                    self.create_soil_tiles()
-                    if self.raining:
-                        self.water_all()
-
-    def create_soil_tiles(self):
-        self.soil_sprites.empty()
-        for index_row, row in enumerate(self.grid):
-            for index_col, cell in enumerate(row):
-                if 'X' in cell:
-
-                    # tile neighbors
-                    t = 'X' in self.grid[index_row - 1][index_col]
-                    b = 'X' in self.grid[index_row + 1][index_col]
-                    r = 'X' in row[index_col + 1]
-                    l = 'X' in row[index_col - 1]
-
-                    # diagonal
-                    tl = 'X' in self.grid[index_row - 1][index_col - 1]
-                    tr = 'X' in self.grid[index_row - 1][index_col + 1]
-                    bl = 'X' in self.grid[index_row + 1][index_col - 1]
-                    br = 'X' in self.grid[index_row + 1][index_col + 1]
-
-                    tile_type = 'o'
-
-                    # all sides
-                    if all([t, b, r, l]): tile_type = 'x'
-
-                    # horizontal tiles only
-                    if l and not any([t, b, r]): tile_type = 'r'
-                    if r and not any([t, b, l]): tile_type = 'l'
-                    if r and l and not any([t, b]): tile_type = 'lr'
-
-                    # vertical tiles only
-                    if t and not any([r, l, b]): tile_type = 'b'
-                    if b and not any([r, l, t]): tile_type = 't'
-                    if b and t and not any([r, l]): tile_type = 'tb'
-
-                    # corners
-                    if r and b and not any([l, t]): tile_type = 'tl'
-                    if l and b and not any([r, t]): tile_type = 'tr'
-                    if r and t and not any([l, b]): tile_type = 'bl'
-                    if l and t and not any([r, b]): tile_type = 'br'
-
-                    # T shapes
-                    if all([t, b, r]) and not l: tile_type = 'tbr'
-                    if all([t, b, l]) and not r: tile_type = 'tbl'
-                    if all([r, l, b]) and not t: tile_type = 'lrt'
-                    if all([r, l, t]) and not b: tile_type = 'lrb'
-
-                    # middle
-                    if all([l, r, b, bl, br]) and not t: tile_type = 'tm'
-                    if all([l, r, t, tl, tr]) and not b: tile_type = 'bm'
-                    if all([t, b, l, tl, bl]) and not r: tile_type = 'rm'
-                    if all([t, b, r, tr, br]) and not l: tile_type = 'lm'
-
-                    if all([l, r, b, bl]) and not t: tile_type = 'tm'
-                    if all([l, r, t, tl]) and not b: tile_type = 'bm'
-                    if all([t, b, l, tl]) and not r: tile_type = 'rm'
-                    if all([t, b, r, tr]) and not l: tile_type = 'lm'
-
-                    if all([l, r, b, br]) and not t: tile_type = 'tm'
-                    if all([l, r, t, tr]) and not b: tile_type = 'bm'
-                    if all([t, b, l, bl]) and not r: tile_type = 'rm'
-                    if all([t, b, r, br]) and not l: tile_type = 'lm'
-
-                    SoilTile(
-                        pos=(index_col * TILE_SIZE, index_row * TILE_SIZE),
-                        surf=self.soil_surfs[tile_type],
-                        groups=[self.all_sprites, self.soil_sprites]
-                    )
+        x, y = self.get_cell(point)
+        if self.grid.has(x, y, FARMABLE):
+            self.hoe_sound.play()
+            self.grid.set(x, y, TILLED)
+            self.update_soil_tiles(x, y)
+            if self.raining:
+                self.water_cell(x, y)
+
+    def place_soil_tile(self, x, y, surf):
+        old_tile = self.soil_tiles.get((x, y))
+        if old_tile and old_tile.image is surf:
+            return
+
+        if old_tile:
+            old_tile.kill()
+        self.soil_tiles[(x, y)] = SoilTile(
+            pos=(x * TILE_SIZE, y * TILE_SIZE),
+            surf=surf,
+            groups=[self.all_sprites, self.soil_sprites]
+        )
+
+    def update_soil_tiles(self, x, y):
+        # tilling a cell can only change its own tile and those of its 8 neighbours
+        for dx, dy in [(0, 0)] + NEIGHBOURS:
+            if self.grid.has(x + dx, y + dy, TILLED):
+                tile_type = SOIL_TILE_TYPES[self.grid.tile_mask(x + dx, y + dy, TILLED)]
+                self.place_soil_tile(x + dx, y + dy, self.soil_surfs[tile_type])
+
+    def water_cell(self, x, y):
+        if self.grid.has(x, y, TILLED) and not self.grid.has(x, y, WATERED):
+            self.grid.set(x, y, WATERED)
+            self.add_water_tile(x, y)
+
+    def add_water_tile(self, x, y):
+        self.water_tiles[(x, y)] = WaterTile(
+            pos=(x * TILE_SIZE, y * TILE_SIZE),
+            surf=random.choice(self.soil_water_sprites),
+            groups=[self.all_sprites, self.water_sprites]
+        )
 
     def water(self, point):
-        for soil_sprite in self.soil_sprites.sprites():
-            if soil_sprite.rect.collidepoint(point):
-                x = soil_sprite.rect.x // TILE_SIZE
-                y = soil_sprite.rect.y // TILE_SIZE
-                self.grid[y][x].append('W')
-
-                WaterTile(
-                    pos=(soil_sprite.rect.x, soil_sprite.rect.y),
-                    surf=random.choice(self.soil_water_sprites),
-                    groups=[self.all_sprites, self.water_sprites]
-                )
+        self.water_cell(*self.get_cell(point))
 
     def water_all(self):
-        for index_row, row in enumerate(self.grid):
-            for index_col, cell in enumerate(row):
-                if 'X' in cell and 'W' not in cell:
-                    cell.append('W')
-                    x = index_col * TILE_SIZE
-                    y = index_row * TILE_SIZE
-                    WaterTile(
-                        pos=(x, y),
-                        surf=random.choice(self.soil_water_sprites),
-                        groups=[self.all_sprites, self.water_sprites]
-                    )
+        for x, y in self.grid.find(TILLED, without=WATERED):
+            self.water_cell(x, y)
 
     def remove_water(self):
-        for sprite in self.water_sprites.sprites():
+        for sprite in self.water_tiles.values():
             sprite.kill()
+        self.water_tiles.clear()
 
-        for row in self.grid:
-            for cell in row:
-                if 'W' in cell:
-                    cell.remove('W')
+        self.grid.clear_all(WATERED)
 
     def plant_seed(self, point, seed):
-        for soil_sprite in self.soil_sprites.sprites():
-            if soil_sprite.rect.collidepoint(point):
-                x = soil_sprite.rect.x // TILE_SIZE
-                y = soil_sprite.rect.y // TILE_SIZE
-                if 'P' not in self.grid[y][x]:
-                    self.grid[y][x].append('P')
-                    Plant(seed, [self.all_sprites, self.plant_sprites, self.collision_sprites], soil_sprite, self.check_watered)
-                    self.plant_sound.play()
-
-    def check_watered(self, soil):
-        x = soil.rect.x // TILE_SIZE
-        y = soil.rect.y // TILE_SIZE
-        cell = self.grid[y][x]
-        is_watered = 'W' in cell
-        return is_watered
+        x, y = self.get_cell(point)
+        if self.grid.has(x, y, TILLED) and not self.grid.has(x, y, PLANTED):
+            self.grid.set(x, y, PLANTED)
+            self.add_plant(x, y, seed)
+            self.plant_sound.play()
+
+    def add_plant(self, x, y, seed):
+        plant = Plant(seed, [self.all_sprites, self.plant_sprites, self.collision_sprites], self.soil_tiles[(x, y)])
+        self.plants[(x, y)] = plant
+        self.crops.add(plant, x, y)
+        return plant
+
+    def remove_plant(self, plant):
+        x, y = self.get_cell(plant.soil.rect.topleft)
+        del self.plants[(x, y)]
+        self.crops.remove(plant)
+        self.stale_plants.discard(plant)
+        self.grid.clear(x, y, PLANTED)
+        plant.kill()
 
     def update_plants(self):
-        for plant in self.plant_sprites.sprites():
-            plant.grow()
\ No newline at end of file
+        grown = self.crops.grow((self.grid.cells & WATERED) != 0)
+        self.stale_plants.update(self.crops.plants[row] for row in grown.tolist())
+
+    def refresh_plants(self):
+        # only plants that reached a new stage get a new image and hitbox
+        crops = self.crops
+        for plant in self.stale_plants:
+            plant.set_stage(int(crops.age[crops.rows[plant]]))
+        self.stale_plants.clear()
+
+    def advance_day(self, raining, materialize=True):
+        # without materialize only the grid and crop arrays change, e.g. for skipped days
+        self.load_pending()
+        self.update_plants()
+        self.remove_water()
+        self.raining = raining
+        if raining:
+            if materialize:
+                self.water_all()
+            else:
+                self.grid.cells[(self.grid.cells & TILLED) != 0] |= WATERED
+
+        if materialize:
+            self.refresh_plants()
+
+    def crop_grids(self):
+        # crop kind + 1 and age per cell, 0 where nothing grows
+        self.load_pending()
+        crops = self.crops
+        n = crops.size
+        kinds = np.zeros_like(self.grid.cells)
+        ages = np.zeros(self.grid.cells.shape, dtype=np.float64)
+        kinds[crops.y[:n], crops.x[:n]] = crops.kind[:n] + 1
+        ages[crops.y[:n], crops.x[:n]] = crops.age[:n]
+        return kinds, ages
+
+    def restore(self, cells, kinds, ages, visible_rect):
+        # grid state right away, sprites for the visible cells now and for the rest over the next frames
+        self.grid.cells[:] = cells
+        self.pending_crops = (kinds, ages)
+
+        center = (visible_rect.centerx // TILE_SIZE, visible_rect.centery // TILE_SIZE)
+        tilled = sorted(self.grid.find(TILLED), key=lambda cell: (cell[0] - center[0]) ** 2 + (cell[1] - center[1]) ** 2)
+        self.pending_cells = deque(tilled)
+
+        visible = [cell for cell in tilled if visible_rect.colliderect((cell[0] * TILE_SIZE, cell[1] * TILE_SIZE, TILE_SIZE, TILE_SIZE))]
+        self.load_pending(len(visible))
+
+    def load_pending(self, budget=None):
+        cells = self.pending_cells
+        count = len(cells) if budget is None else min(budget, len(cells))
+        kinds, ages = self.pending_crops if cells else (None, None)
+        # masks for the whole grid per batch, neighbours may have been tilled since the restore
+        masks = self.grid.tile_masks(TILLED) if count else None
+        for _ in range(count):
+            x, y = cells.popleft()
+            self.place_soil_tile(x, y, self.soil_surfs[SOIL_TILE_TYPES[masks[y, x]]])
+
+            if self.grid.has(x, y, WATERED) and (x, y) not in self.water_tiles:
+                self.add_water_tile(x, y)
+
+            if kinds[y, x] and (x, y) not in self.plants:
+                plant = self.add_plant(x, y, CROP_TYPES[kinds[y, x] - 1])
+                self.crops.age[self.crops.rows[plant]] = ages[y, x]
+                if int(ages[y, x]) > 0:
+                    plant.set_stage(int(ages[y, x]))
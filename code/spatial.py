@@ -0,0 +1,86 @@
+import pygame
+from settings import *
+
+
+class SpatialGrid:
+    def __init__(self, cell_size=GRID_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.sprite_cells = {}
+
+    def __len__(self):
+        return len(self.sprite_cells)
+
+    def __iter__(self):
+        return iter(self.sprite_cells)
+
+    def __contains__(self, sprite):
+        return sprite in self.sprite_cells
+
+    def cell_range(self, rect):
+        size = self.cell_size
+        return rect.left // size, rect.top // size, (rect.right - 1) // size, (rect.bottom - 1) // size
+
+    def cells_in_range(self, cell_range):
+        left, top, right, bottom = cell_range
+        for x in range(left, right + 1):
+            for y in range(top, bottom + 1):
+                yield x, y
+
+    def bounds(self, sprite):
+        left, top, right, bottom = self.sprite_cells[sprite]
+        size = self.cell_size
+        return pygame.Rect(left * size, top * size, (right - left + 1) * size, (bottom - top + 1) * size)
+
+    def insert(self, sprite, rect):
+        cell_range = self.cell_range(rect)
+        self.sprite_cells[sprite] = cell_range
+        for cell in self.cells_in_range(cell_range):
+            if cell not in self.cells:
+                self.cells[cell] = set()
+            self.cells[cell].add(sprite)
+
+    def remove(self, sprite):
+        cell_range = self.sprite_cells.pop(sprite, None)
+        if cell_range is None:
+            return
+
+        for cell in self.cells_in_range(cell_range):
+            bucket = self.cells[cell]
+            bucket.discard(sprite)
+            if not bucket:
+                del self.cells[cell]
+
+    def move(self, sprite, rect):
+        # most moves stay inside the same cells, so only touch the buckets when they do not
+        if self.sprite_cells.get(sprite) != self.cell_range(rect):
+            self.remove(sprite)
+            self.insert(sprite, rect)
+
+    def query(self, rect):
+        found = set()
+        for cell in self.cells_in_range(self.cell_range(rect)):
+            bucket = self.cells.get(cell)
+            if bucket:
+                found.update(bucket)
+        return found
+
+
+def merge_rects(rects, limit=DIRTY_RECT_LIMIT):
+    # unions overlapping screen rects, None when a full update is cheaper
+    screen_rect = pygame.Rect(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT)
+    merged = []
+    for rect in rects:
+        rect = screen_rect.clip(rect)
+        if not rect:
+            continue
+
+        index = rect.collidelist(merged)
+        while index != -1:
+            rect.union_ip(merged.pop(index))
+            index = rect.collidelist(merged)
+        merged.append(rect)
+
+    if len(merged) > limit or sum(rect.w * rect.h for rect in merged) > SCREEN_WIDTH * SCREEN_HEIGHT / 2:
+        return None
+    return merged
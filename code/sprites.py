@@ -2,6 +2,7 @@ import pygame
 from settings import *
 from random import randint, choice
 from timer import Timer
+from support import import_image, import_sound, silhouette
 
 
 class Generic(pygame.sprite.Sprite):
@@ -12,6 +13,11 @@ class Generic(pygame.sprite.Sprite):
         self.z = z
         self.hitbox = self.rect.copy().inflate((-self.rect.width * 0.2, -self.rect.height * 0.75))
 
+    def refresh(self):
+        for group in self.groups():
+            if hasattr(group, 'refresh'):
+                group.refresh(self)
+
 
 class Interaction(Generic):
     def __init__(self, pos, size, groups, name):
@@ -20,25 +26,40 @@ class Interaction(Generic):
         self.name = name
 
 
-class Water(Generic):
-
-    def __init__(self, pos, frames, groups):
-
-        # animation setup
+class AnimationClock:
+    def __init__(self, frames, speed):
         self.frames = frames
+        self.speed = speed
         self.frame_index = 0
+        self.image = self.frames[0]
+
+        # every sprite showing this animation, all on the same frame
+        self.sprites = pygame.sprite.Group()
 
-        # sprite setup
-        super().__init__(pos=pos, surf=self.frames[self.frame_index], groups=groups, z=LAYERS['water'])
+    def add(self, sprite):
+        sprite.image = self.image
+        self.sprites.add(sprite)
 
-    def animate(self, dt):
-        self.frame_index += 5 * dt
+    def update(self, dt):
+        self.frame_index += self.speed * dt
         if self.frame_index >= len(self.frames):
             self.frame_index = 0
-        self.image = self.frames[int(self.frame_index)]
 
-    def update(self, dt):
-        self.animate(dt)
+        # the sprites are only touched when the frame actually changes
+        image = self.frames[int(self.frame_index)]
+        if image is not self.image:
+            self.image = image
+            for sprite in self.sprites:
+                sprite.image = image
+
+
+class Water(Generic):
+
+    def __init__(self, pos, clock, groups):
+
+        # sprite setup, the shared clock animates it
+        super().__init__(pos=pos, surf=clock.image, groups=groups, z=LAYERS['water'])
+        clock.add(self)
 
 
 class WildFlower(Generic):
@@ -51,19 +72,14 @@ class WildFlower(Generic):
 class Particle(Generic):
     def __init__(self, pos, surf, groups, z, duration = 200):
         super().__init__(pos=pos, surf=surf, groups=groups, z=z)
-        self.start_time = pygame.time.get_ticks()
-        self.duration = duration
+        self.timer = Timer(duration, self.kill)
+        self.timer.activate()
 
         # white surface
-        mask_surf = pygame.mask.from_surface(self.image)
-        new_surf = mask_surf.to_surface()
-        new_surf.set_colorkey((0, 0, 0))
-        self.image = new_surf
+        self.image = silhouette(surf)
 
     def update(self, dt):
-        current_time = pygame.time.get_ticks()
-        if current_time - self.start_time > self.duration:
-            self.kill()
+        self.timer.update(dt)
 
 
 class Tree(Generic):
@@ -71,35 +87,38 @@ class Tree(Generic):
     def __init__(self, pos, surf, groups, name, player_add):
         super().__init__(pos=pos, surf=surf, groups=groups)
 
+        for g in self.groups():
+            if g.__class__.__name__ == 'CameraGroup':
+                self.all_sprites = g
+
         # tree attributes
         self.health = 5
         self.alive = True
         stump_path = f'../graphics/stumps/{"small" if name == "Small" else "large"}.png'
-        self.stump_surf = pygame.image.load(stump_path).convert_alpha()
+        self.stump_surf = import_image(stump_path)
 
         # apples
-        self.apple_surf = pygame.image.load('../graphics/fruit/apple.png').convert_alpha()
+        self.apple_surf = import_image('../graphics/fruit/apple.png')
         self.apple_pos = APPLE_POS[name]
         self.apple_sprites = pygame.sprite.Group()
         self.create_fruit()
 
         self.player_add = player_add
 
-        self.axe_sound = pygame.mixer.Sound('../audio/axe.mp3')
+        self.axe_sound = import_sound('../audio/axe.mp3')
 
     def create_fruit(self):
         if not self.alive:
             return
 
-        for g in self.groups():
-            if g.__class__.__name__ == 'CameraGroup':
-                all_sprites = g
-
         for pos in self.apple_pos:
             if randint(0, 10) < 2:
                 x = pos[0] + self.rect.left
                 y = pos[1] + self.rect.top
-                Generic((x, y), self.apple_surf, [self.apple_sprites, all_sprites], LAYERS['fruit'])
+                self.add_fruit((x, y))
+
+    def add_fruit(self, pos):
+        Generic(pos, self.apple_surf, [self.apple_sprites, self.all_sprites], LAYERS['fruit'])
 
     def damage(self):
         self.health -= 1
@@ -111,7 +130,7 @@ class Tree(Generic):
             Particle(
                 pos = random_apple.rect.topleft,
                 surf = random_apple.image,
-                groups = random_apple.groups(),
+                groups = self.all_sprites,
                 z = LAYERS['fruit']
             )
             self.player_add('apple')
@@ -119,13 +138,17 @@ class Tree(Generic):
 
     def check_death(self):
         if self.health <= 0:
-            Particle(self.rect.topleft, self.image, self.groups(), LAYERS['fruit'], 300)
-            self.image = self.stump_surf
-            self.rect = self.image.get_rect(midbottom=self.rect.midbottom)
-            self.hitbox = self.rect.copy().inflate((-10, -self.rect.height * 0.6))
-            self.alive = False
+            Particle(self.rect.topleft, self.image, self.all_sprites, LAYERS['fruit'], 300)
+            self.die()
             self.player_add('wood')
 
+    def die(self):
+        self.image = self.stump_surf
+        self.rect = self.image.get_rect(midbottom=self.rect.midbottom)
+        self.hitbox = self.rect.copy().inflate((-10, -self.rect.height * 0.6))
+        self.alive = False
+        self.refresh()
+
     def update(self, dt):
         if self.alive:
             self.check_death()
\ No newline at end of file
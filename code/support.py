@@ -1,27 +1,82 @@
 import pygame
-from os import walk
+from os import walk, path as os_path
+from weakref import WeakKeyDictionary
+
+# process wide asset cache, keyed by kind and normalized path
+asset_cache = {}
+asset_stats = {'hits': 0, 'misses': 0}
+
+# white silhouettes keyed by source surface, dropped together with it
+silhouette_cache = WeakKeyDictionary()
+
+
+def cache_key(kind, path):
+    return kind, os_path.normpath(path)
+
+
+def load_cached(kind, path, loader):
+    key = cache_key(kind, path)
+    if key in asset_cache:
+        asset_stats['hits'] += 1
+    else:
+        asset_stats['misses'] += 1
+        asset_cache[key] = loader()
+    return asset_cache[key]
+
+
+def asset_report():
+    lookups = asset_stats['hits'] + asset_stats['misses']
+    return {
+        'entries': len(asset_cache),
+        'hits': asset_stats['hits'],
+        'misses': asset_stats['misses'],
+        'hit_rate': asset_stats['hits'] / lookups if lookups else 0
+    }
+
+
+def import_image(path):
+    return load_cached('image', path, lambda: pygame.image.load(path).convert_alpha())
+
+
+def import_sound(path):
+    return load_cached('sound', path, lambda: pygame.mixer.Sound(path))
 
 
 def import_folder(path):
-    surface_list = []
+    def load():
+        surface_list = []
 
-    for _, __, img_files in walk(path):
-        for image in img_files:
-            full_path = path + '/' + image
-            image_surf = pygame.image.load(full_path).convert_alpha()
-            surface_list.append(image_surf)
+        for _, __, img_files in walk(path):
+            for image in img_files:
+                full_path = path + '/' + image
+                image_surf = import_image(full_path)
+                surface_list.append(image_surf)
 
-    return surface_list
+        return surface_list
+
+    return load_cached('folder', path, load)
 
 
 def import_folder_dict(path):
-    surface_dict = {}
+    def load():
+        surface_dict = {}
+
+        for _, __, img_files in walk(path):
+            for image in img_files:
+                full_path = path + '/' + image
+                image_surf = import_image(full_path)
+                image_name = image.split('.')[0]
+                surface_dict[image_name] = image_surf
+
+        return surface_dict
+
+    return load_cached('folder dict', path, load)
 
-    for _, __, img_files in walk(path):
-        for image in img_files:
-            full_path = path + '/' + image
-            image_surf = pygame.image.load(full_path).convert_alpha()
-            image_name = image.split('.')[0]
-            surface_dict[image_name] = image_surf
 
-    return surface_dict
\ No newline at end of file
+def silhouette(surf):
+    if surf not in silhouette_cache:
+        mask_surf = pygame.mask.from_surface(surf)
+        new_surf = mask_surf.to_surface()
+        new_surf.set_colorkey((0, 0, 0))
+        silhouette_cache[surf] = new_surf
+    return silhouette_cache[surf]
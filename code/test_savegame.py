@@ -0,0 +1,160 @@
+import json
+import os
+import random
+import zlib
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import numpy as np
+import pygame
+import pytest
+from settings import *
+from level import Level
+from savegame import SaveGame, SAVE_HEADER, JOURNAL_HEADER, pack
+from soil import FARMABLE
+
+
+@pytest.fixture
+def new_level(monkeypatch):
+    # asset paths are relative to the code folder
+    monkeypatch.chdir(os.path.dirname(os.path.abspath(__file__)))
+    pygame.init()
+    pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+
+    def build():
+        random.seed(1)
+        return Level()
+    return build
+
+
+@pytest.fixture
+def save_path(tmp_path):
+    return str(tmp_path / 'save.bin')
+
+
+def till(level, cells, seed=None):
+    soil_layer = level.soil_layer
+    for x, y in cells:
+        point = (x * TILE_SIZE + TILE_SIZE / 2, y * TILE_SIZE + TILE_SIZE / 2)
+        soil_layer.get_hit(point)
+        if seed:
+            soil_layer.plant_seed(point, seed)
+
+
+def farm_cells(level):
+    return list(level.soil_layer.grid.find(FARMABLE))
+
+
+def wait_for_writes(save_game):
+    # the writer runs one job at a time, so an empty job finishes after every earlier write
+    save_game.writer.submit(lambda: None).result()
+    save_game.check_writes()
+
+
+def same_state(state, other):
+    meta, grids = state
+    other_meta, other_grids = other
+    return meta == other_meta and all(np.array_equal(grids[name], other_grids[name]) for name in grids)
+
+
+def load_into(new_level, save_path):
+    save_game = SaveGame(new_level(), save_path)
+    return save_game, save_game.load()
+
+
+def test_round_trip_with_harvest(new_level, save_path):
+    level = new_level()
+    till(level, farm_cells(level)[:20], 'corn')
+    save_game = SaveGame(level, save_path)
+    save_game.save()
+
+    # grow the corn until it can be picked, then walk into one plant
+    for _ in range(6):
+        level.soil_layer.water_all()
+        level.start_day()
+    plant = next(plant for plant in level.soil_layer.plant_sprites if plant.harvestable)
+    level.player.hitbox.center = plant.rect.center
+    level.plant_collision()
+    assert level.player.item_inventory['corn'] == 1
+
+    save_game.autosave()
+    wait_for_writes(save_game)
+    expected = save_game.capture()
+
+    loaded, ok = load_into(new_level, save_path)
+    assert ok
+    assert loaded.autosaves == 1
+    assert same_state(loaded.capture(), expected)
+
+
+def test_journal_cut_mid_record(new_level, save_path):
+    level = new_level()
+    cells = farm_cells(level)
+    save_game = SaveGame(level, save_path)
+    save_game.save()
+
+    till(level, cells[:10])
+    save_game.autosave()
+    first = save_game.capture()
+    till(level, cells[10:20])
+    save_game.autosave()
+    wait_for_writes(save_game)
+
+    with open(save_path + '.journal', 'rb') as file:
+        journal = file.read()
+    with open(save_path + '.journal', 'wb') as file:
+        file.write(journal[:-10])
+
+    loaded, ok = load_into(new_level, save_path)
+    assert ok
+    assert same_state(loaded.capture(), first)
+    # new records must not follow the damaged tail, the next autosave writes a snapshot
+    assert loaded.autosaves == SNAPSHOT_EVERY
+
+
+def test_journal_of_another_snapshot(new_level, save_path):
+    level = new_level()
+    save_game = SaveGame(level, save_path)
+    save_game.save()
+    snapshot_state = save_game.capture()
+
+    till(level, farm_cells(level)[:10])
+    save_game.autosave()
+    wait_for_writes(save_game)
+
+    with open(save_path + '.journal', 'r+b') as file:
+        magic, version, snapshot = JOURNAL_HEADER.unpack(file.read(JOURNAL_HEADER.size))
+        file.seek(0)
+        file.write(JOURNAL_HEADER.pack(magic, version, snapshot + 1))
+
+    loaded, ok = load_into(new_level, save_path)
+    assert ok
+    assert same_state(loaded.capture(), snapshot_state)
+
+
+def test_map_size_mismatch_starts_fresh(new_level, save_path):
+    level = new_level()
+    till(level, farm_cells(level)[:10])
+    save_game = SaveGame(level, save_path)
+    save_game.save()
+    wait_for_writes(save_game)
+
+    # the same save, made on a smaller map
+    with open(save_path, 'rb') as file:
+        data = file.read()
+    magic, version, header_length = SAVE_HEADER.unpack_from(data)
+    header = json.loads(data[SAVE_HEADER.size:SAVE_HEADER.size + header_length])
+    cells = np.zeros((10, 12), dtype=np.uint8)
+    header['grids'], blob = pack({'cells': cells, 'kinds': cells.copy(), 'ages': np.zeros((10, 12))})
+    header_bytes = json.dumps(header).encode()
+    with open(save_path, 'wb') as file:
+        file.write(SAVE_HEADER.pack(magic, version, len(header_bytes)))
+        file.write(header_bytes)
+        file.write(zlib.compress(blob))
+
+    fresh = new_level()
+    fresh_state = SaveGame(fresh, save_path).capture()
+    loaded = SaveGame(fresh, save_path)
+    assert not loaded.load()
+    assert same_state(loaded.capture(), fresh_state)
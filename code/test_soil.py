@@ -0,0 +1,125 @@
+import numpy as np
+from soil import SoilGrid, SOIL_TILE_TYPES, NEIGHBOURS, TILLED, FARMABLE
+
+
+def random_grids(count=50, seed=7):
+    rng = np.random.default_rng(seed)
+    for _ in range(count):
+        width, height = rng.integers(1, 12, 2)
+        grid = SoilGrid(width, height)
+        # dense and sparse fills, plus unrelated flags that the masks must ignore
+        density = rng.choice([0.2, 0.5, 0.8])
+        grid.cells[:] = (rng.random((height, width)) < density) * TILLED | FARMABLE
+        yield grid
+
+
+def ladder_mask(grid, x, y, flag):
+    # neighbours looked up one by one, anything past the edge counts as empty
+    mask = 0
+    for bit, (dx, dy) in enumerate(NEIGHBOURS):
+        nx, ny = x + dx, y + dy
+        if 0 <= nx < grid.width and 0 <= ny < grid.height and grid.cells[ny, nx] & flag:
+            mask |= 1 << bit
+    return mask
+
+
+def test_tile_masks_match_tile_mask():
+    for grid in random_grids():
+        masks = grid.tile_masks(TILLED)
+        for y in range(grid.height):
+            for x in range(grid.width):
+                assert masks[y, x] == grid.tile_mask(x, y, TILLED) == ladder_mask(grid, x, y, TILLED)
+
+
+def baseline_tile_types(grid):
+    # create_soil_tiles before the grid became an array, with 'X' marking tilled cells
+    tile_types = {}
+    for index_row, row in enumerate(grid):
+        for index_col, cell in enumerate(row):
+            if 'X' in cell:
+
+                # tile neighbors
+                t = 'X' in grid[index_row - 1][index_col]
+                b = 'X' in grid[index_row + 1][index_col]
+                r = 'X' in row[index_col + 1]
+                l = 'X' in row[index_col - 1]
+
+                # diagonal
+                tl = 'X' in grid[index_row - 1][index_col - 1]
+                tr = 'X' in grid[index_row - 1][index_col + 1]
+                bl = 'X' in grid[index_row + 1][index_col - 1]
+                br = 'X' in grid[index_row + 1][index_col + 1]
+
+                tile_type = 'o'
+
+                # all sides
+                if all([t, b, r, l]): tile_type = 'x'
+
+                # horizontal tiles only
+                if l and not any([t, b, r]): tile_type = 'r'
+                if r and not any([t, b, l]): tile_type = 'l'
+                if r and l and not any([t, b]): tile_type = 'lr'
+
+                # vertical tiles only
+                if t and not any([r, l, b]): tile_type = 'b'
+                if b and not any([r, l, t]): tile_type = 't'
+                if b and t and not any([r, l]): tile_type = 'tb'
+
+                # corners
+                if r and b and not any([l, t]): tile_type = 'tl'
+                if l and b and not any([r, t]): tile_type = 'tr'
+                if r and t and not any([l, b]): tile_type = 'bl'
+                if l and t and not any([r, b]): tile_type = 'br'
+
+                # T shapes
+                if all([t, b, r]) and not l: tile_type = 'tbr'
+                if all([t, b, l]) and not r: tile_type = 'tbl'
+                if all([r, l, b]) and not t: tile_type = 'lrt'
+                if all([r, l, t]) and not b: tile_type = 'lrb'
+
+                # middle
+                if all([l, r, b, bl, br]) and not t: tile_type = 'tm'
+                if all([l, r, t, tl, tr]) and not b: tile_type = 'bm'
+                if all([t, b, l, tl, bl]) and not r: tile_type = 'rm'
+                if all([t, b, r, tr, br]) and not l: tile_type = 'lm'
+
+                if all([l, r, b, bl]) and not t: tile_type = 'tm'
+                if all([l, r, t, tl]) and not b: tile_type = 'bm'
+                if all([t, b, l, tl]) and not r: tile_type = 'rm'
+                if all([t, b, r, tr]) and not l: tile_type = 'lm'
+
+                if all([l, r, b, br]) and not t: tile_type = 'tm'
+                if all([l, r, t, tr]) and not b: tile_type = 'bm'
+                if all([t, b, l, bl]) and not r: tile_type = 'rm'
+                if all([t, b, r, br]) and not l: tile_type = 'lm'
+
+                tile_types[(index_col, index_row)] = tile_type
+    return tile_types
+
+
+def test_tile_types_match_baseline():
+    for grid in random_grids():
+        # the old lists wrapped or ran out at the map border, which farmland never touches,
+        # so the grid sits inside an empty ring; the random grid's own edges are still covered
+        cells = [[[] for _ in range(grid.width + 2)] for _ in range(grid.height + 2)]
+        for y in range(grid.height):
+            for x in range(grid.width):
+                cells[y + 1][x + 1].append('F')
+                if grid.cells[y, x] & TILLED:
+                    cells[y + 1][x + 1].append('X')
+        expected = {(x - 1, y - 1): tile_type for (x, y), tile_type in baseline_tile_types(cells).items()}
+
+        masks = grid.tile_masks(TILLED)
+        actual = {(x, y): SOIL_TILE_TYPES[masks[y, x]] for x, y in grid.find(TILLED)}
+        assert actual == expected
+
+
+def test_edge_cells_ignore_outside():
+    grid = SoilGrid(3, 3)
+    grid.cells[:] = TILLED
+    masks = grid.tile_masks(TILLED)
+    assert SOIL_TILE_TYPES[masks[0, 0]] == 'tl'
+    assert SOIL_TILE_TYPES[masks[0, 1]] == 'tm'
+    assert SOIL_TILE_TYPES[masks[1, 1]] == 'x'
+    assert SOIL_TILE_TYPES[masks[2, 2]] == 'br'
+
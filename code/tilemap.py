@@ -0,0 +1,199 @@
+import json
+import re
+import struct
+from array import array
+from contextlib import contextmanager
+from hashlib import sha1
+from os import path as os_path, replace
+from time import perf_counter
+
+import pygame
+from pytmx import TiledTileLayer, TiledObjectGroup
+from pytmx.util_pygame import load_pygame
+from settings import *
+
+# parsed maps shared by every subsystem, keyed by path
+map_cache = {}
+
+CACHE_MAGIC = b'SPMC'
+CACHE_VERSION = 1
+CACHE_HEADER = struct.Struct('<4sHI')
+
+
+class MapObject:
+    def __init__(self, x, y, width, height, name, gid, image):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.name = name
+        self.gid = gid
+        self.image = image
+
+
+class TileMap:
+    def __init__(self, path):
+        self.path = path
+        self.cache_path = path + '.cache'
+        self.timings = {}
+
+        # tile gids per layer, object lists per group and one surface per used gid
+        self.layers = {}
+        self.object_groups = {}
+        self.images = {}
+
+        with self.timed('cache load'):
+            loaded = MAP_CACHE and self.load_cache()
+
+        if not loaded:
+            with self.timed('parse'):
+                self.read_tmx(load_pygame(path))
+            if MAP_CACHE:
+                with self.timed('cache write'):
+                    # the cache is only an optimisation, a read-only data folder just skips it
+                    try:
+                        self.write_cache()
+                    except OSError:
+                        pass
+
+    @contextmanager
+    def timed(self, name):
+        start = perf_counter()
+        yield
+        self.timings[name] = self.timings.get(name, 0) + perf_counter() - start
+
+    def timing_report(self):
+        lines = [f'{name:<24}{seconds * 1000:8.1f} ms' for name, seconds in self.timings.items()]
+        lines.append(f'{"total":<24}{sum(self.timings.values()) * 1000:8.1f} ms')
+        return '\n'.join(lines)
+
+    def tiles(self, layer):
+        width, _, gids = self.layers[layer]
+        for index, gid in enumerate(gids):
+            if gid:
+                yield index % width, index // width, self.images[gid]
+
+    def objects(self, layer):
+        return iter(self.object_groups[layer])
+
+    def read_tmx(self, tmx_data):
+        for layer in tmx_data.layers:
+            if isinstance(layer, TiledTileLayer):
+                gids = array('H', (gid for row in layer.data for gid in row))
+                self.layers[layer.name] = (layer.width, layer.height, gids)
+                for gid in set(gids):
+                    if gid:
+                        self.images[gid] = tmx_data.images[gid]
+
+            elif isinstance(layer, TiledObjectGroup):
+                objects = []
+                for obj in layer:
+                    image = tmx_data.images[obj.gid] if obj.gid else None
+                    if image:
+                        self.images[obj.gid] = image
+                    objects.append(MapObject(obj.x, obj.y, obj.width, obj.height, obj.name, obj.gid, image))
+                self.object_groups[layer.name] = objects
+
+    def source_hashes(self):
+        # the map, its tilesets and their images; every file named by a source attribute
+        hashes = {}
+        paths = [os_path.normpath(self.path)]
+        while paths:
+            file_path = paths.pop()
+            if file_path in hashes:
+                continue
+
+            with open(file_path, 'rb') as file:
+                data = file.read()
+            hashes[file_path] = sha1(data).hexdigest()
+
+            if file_path.endswith(('.tmx', '.tsx')):
+                folder = os_path.dirname(file_path)
+                for source in re.findall(rb'source="([^"]+)"', data):
+                    paths.append(os_path.normpath(os_path.join(folder, source.decode())))
+        return hashes
+
+    def write_cache(self):
+        blob = bytearray()
+        meta = {'sources': self.source_hashes(), 'layers': [], 'images': [], 'objects': {}}
+
+        for name, (width, height, gids) in self.layers.items():
+            meta['layers'].append([name, width, height, len(blob)])
+            blob += gids.tobytes()
+
+        # pre-sliced atlas: colorkeys are resolved into the alpha channel
+        for gid, image in self.images.items():
+            surf = pygame.Surface(image.get_size(), pygame.SRCALPHA)
+            surf.blit(image, (0, 0))
+            meta['images'].append([gid, surf.get_width(), surf.get_height(), len(blob)])
+            blob += pygame.image.tobytes(surf, 'RGBA')
+
+        for name, objects in self.object_groups.items():
+            meta['objects'][name] = [[obj.x, obj.y, obj.width, obj.height, obj.name, obj.gid] for obj in objects]
+
+        # written aside and swapped in, so an interrupted write never leaves a truncated cache
+        meta_bytes = json.dumps(meta).encode()
+        temp_path = self.cache_path + '.tmp'
+        with open(temp_path, 'wb') as file:
+            file.write(CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, len(meta_bytes)))
+            file.write(meta_bytes)
+            file.write(blob)
+        replace(temp_path, self.cache_path)
+
+    def load_cache(self):
+        try:
+            with open(self.cache_path, 'rb') as file:
+                data = file.read()
+        except OSError:
+            return False
+
+        # a damaged or foreign cache is treated like a missing one and rebuilt from the tmx
+        try:
+            loaded = self.read_cache(data)
+        except (ValueError, KeyError, json.JSONDecodeError, struct.error):
+            loaded = False
+
+        if not loaded:
+            self.layers.clear()
+            self.object_groups.clear()
+            self.images.clear()
+        return loaded
+
+    def read_cache(self, data):
+        if len(data) < CACHE_HEADER.size:
+            return False
+        magic, version, meta_length = CACHE_HEADER.unpack_from(data)
+        if magic != CACHE_MAGIC or version != CACHE_VERSION:
+            return False
+
+        meta_end = CACHE_HEADER.size + meta_length
+        meta = json.loads(data[CACHE_HEADER.size:meta_end])
+        try:
+            if meta['sources'] != self.source_hashes():
+                return False
+        except OSError:
+            return False
+
+        blob = memoryview(data)[meta_end:]
+        for gid, width, height, offset in meta['images']:
+            pixels = blob[offset:offset + width * height * 4]
+            self.images[gid] = pygame.image.frombuffer(pixels, (width, height), 'RGBA').convert_alpha()
+
+        for name, width, height, offset in meta['layers']:
+            gids = array('H')
+            gids.frombytes(blob[offset:offset + width * height * gids.itemsize])
+            if len(gids) != width * height:
+                return False
+            self.layers[name] = (width, height, gids)
+
+        for name, objects in meta['objects'].items():
+            self.object_groups[name] = [
+                MapObject(x, y, width, height, obj_name, gid, self.images[gid] if gid else None)
+                for x, y, width, height, obj_name, gid in objects]
+        return True
+
+
+def load_map(path):
+    if path not in map_cache:
+        map_cache[path] = TileMap(path)
+    return map_cache[path]
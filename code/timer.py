@@ -1,24 +1,23 @@
-import pygame
-
-
 class Timer:
     def __init__(self, duration, func=None):
         self.duration = duration
         self.func = func
-        self.start_time = 0
+        self.elapsed = 0
         self.active = False
 
     def activate(self):
         self.active = True
-        self.start_time = pygame.time.get_ticks()
+        self.elapsed = 0
 
     def deactivate(self):
         self.active = False
-        self.start_time = 0
+        self.elapsed = 0
 
-    def update(self):
+    def update(self, dt):
+        # counts simulated time, so timers keep pace with fixed timestep and headless runs
         if self.active:
-            if pygame.time.get_ticks() - self.start_time >= self.duration:
-                if self.func and self.start_time != 0:
+            self.elapsed += dt * 1000
+            if self.elapsed >= self.duration:
+                if self.func:
                     self.func()
                 self.deactivate()
@@ -14,8 +14,9 @@ class Transition:
         self.image = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
         self.color = 255
         self.speed = -2
+        self.filled_color = None
 
-    def play(self, dt):
+    def update(self, dt):
         self.color += self.speed
         if self.color <= 0:
             self.speed *= -1
@@ -26,5 +27,11 @@ class Transition:
             self.player.sleep = False
             self.speed = -2
 
-        self.image.fill((self.color, self.color, self.color))
+    def display(self):
+        if self.color == 255:
+            return
+
+        if self.color != self.filled_color:
+            self.image.fill((self.color, self.color, self.color))
+            self.filled_color = self.color
         self.display_surface.blit(self.image, (0, 0), special_flags=pygame.BLEND_RGBA_MULT)